@@ -0,0 +1,87 @@
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+from florianistudio import OUTPUT_PROFILES, jpeg_save_options, source_jpeg_settings
+
+SYNTHETIC_SIZES = {"2mp": (1732, 1155), "12mp": (4240, 2832), "24mp": (6000, 4000), "48mp": (8000, 6000)}
+
+def synthetic_image(size, seed):
+    # Deterministic "photo-like" content: fractal detail, smooth gradients and
+    # a little blurred sensor noise, encoded once as a q92 camera JPEG.
+    rng = random.Random(seed)
+    width, height = size
+    fractal = Image.effect_mandelbrot(size, (-2.0 + rng.random() * 0.5, -1.2, 0.8, 1.2), 100)
+    gradient = Image.linear_gradient("L").resize(size)
+    radial = Image.radial_gradient("L").resize(size)
+    noise = Image.frombytes("L", (width // 4, height // 4), rng.randbytes((width // 4) * (height // 4)))
+    noise = noise.resize(size, Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+    img = Image.merge("RGB", (fractal, Image.blend(gradient, noise, 0.3), Image.blend(radial, fractal, 0.5)))
+    buffer = io.BytesIO()
+    img.save(buffer, "jpeg", quality=92)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+def load_corpus(corpus_dir, sizes, count):
+    if corpus_dir:
+        paths = sorted(glob.glob(os.path.join(corpus_dir, "*.jp*g")))[:count]
+        return [(os.path.basename(path), Image.open(path)) for path in paths]
+    corpus = []
+    for name in sizes:
+        for index in range(count):
+            corpus.append((f"{name}-{index}", synthetic_image(SYNTHETIC_SIZES[name], seed=index)))
+    return corpus
+
+def run(corpus, profiles, repeat):
+    prepared = []
+    for name, img in corpus:
+        settings = source_jpeg_settings(img)
+        prepared.append((name, img.convert("RGB"), settings))
+    results = []
+    for profile in profiles:
+        encode_seconds = 0.0
+        total_bytes = 0
+        for _, img, settings in prepared:
+            options = jpeg_save_options(profile, settings)
+            for _ in range(repeat):
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                img.save(buffer, "jpeg", **options)
+                encode_seconds += time.perf_counter() - start
+            total_bytes += buffer.tell()
+        images = len(prepared) * repeat
+        results.append({
+            "profile": profile,
+            "images": len(prepared),
+            "encode_seconds": round(encode_seconds / repeat, 4),
+            "images_per_second": round(images / encode_seconds, 2) if encode_seconds else None,
+            "bytes": total_bytes,
+            "bytes_per_image": total_bytes // max(1, len(prepared)),
+        })
+    baseline = next((result["bytes"] for result in results if result["profile"] == "default"), None)
+    for result in results:
+        result["size_vs_default"] = round(result["bytes"] / baseline, 3) if baseline else None
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de codificação x tamanho por perfil de saída JPEG.")
+    parser.add_argument("--corpus", help="Pasta com JPEGs reais (padrão: corpus sintético determinístico)")
+    parser.add_argument("--sizes", nargs="+", default=["2mp", "12mp"], choices=sorted(SYNTHETIC_SIZES))
+    parser.add_argument("--count", type=int, default=3, help="Imagens por tamanho (ou total, com --corpus)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições de cada codificação")
+    parser.add_argument("--profiles", nargs="+", default=list(OUTPUT_PROFILES), choices=list(OUTPUT_PROFILES))
+    args = parser.parse_args(argv)
+    corpus = load_corpus(args.corpus, args.sizes, args.count)
+    print(json.dumps({"benchmark": "jpeg_profiles", "results": run(corpus, args.profiles, args.repeat)}, indent=2))
+
+if __name__ == "__main__":
+    main()
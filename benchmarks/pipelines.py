@@ -0,0 +1,249 @@
+import argparse
+import contextlib
+import cProfile
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import piexif
+
+from florianistudio import apply_watermark, convert_image_to_base64, process_image
+from mp4_metadata_editor import get_video_metadata, update_video_metadata
+from jpeg_profiles import SYNTHETIC_SIZES, synthetic_image
+
+DEFAULT_LOGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logo render.png")
+VIDEO_PRESETS = {"720p": "1280x720", "1080p": "1920x1080"}
+IMAGE_STAGES = ["apply_watermark", "process_image", "process_image_lossless", "convert_image_to_base64"]
+VIDEO_STAGES = ["get_video_metadata", "get_video_metadata_native", "update_video_metadata", "update_video_metadata_ffmpeg"]
+
+def camera_exif():
+    return piexif.dump({
+        "0th": {
+            piexif.ImageIFD.Make: b"Benchmark",
+            piexif.ImageIFD.Model: b"Synthetic 1",
+            piexif.ImageIFD.Software: b"florianistudio-bench",
+        },
+        "Exif": {
+            piexif.ExifIFD.DateTimeOriginal: b"2024:01:01 12:00:00",
+            piexif.ExifIFD.ExposureTime: (1, 250),
+            piexif.ExifIFD.FNumber: (28, 10),
+            piexif.ExifIFD.ISOSpeedRatings: 200,
+        },
+    })
+
+def make_image_corpus(workdir, sizes, count):
+    paths = []
+    for name in sizes:
+        for index in range(count):
+            img = synthetic_image(SYNTHETIC_SIZES[name], seed=index)
+            for variant, extra in (("plain", {}), ("exif", {"exif": camera_exif()})):
+                path = os.path.join(workdir, f"{name}-{index}-{variant}.jpg")
+                img.save(path, "jpeg", quality=92, **extra)
+                paths.append(path)
+    return paths
+
+def make_video_corpus(workdir, presets, seconds, ffmpeg="ffmpeg"):
+    paths = []
+    for name in presets:
+        path = os.path.join(workdir, f"testsrc-{name}.mp4")
+        cmd = [
+            ffmpeg, "-y", "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size={VIDEO_PRESETS[name]}:rate=30",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path,
+        ]
+        subprocess.run(cmd, check=True)
+        paths.append(path)
+    return paths
+
+def peak_rss_mb():
+    # On Linux ru_maxrss survives execve, so a spawned child would report the
+    # parent's high-water mark; VmHWM belongs to the new address space.
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def image_stage(stage, logo):
+    if stage == "apply_watermark":
+        return lambda path: apply_watermark(path, logo)
+    if stage == "process_image":
+        return lambda path: process_image(path)
+    if stage == "process_image_lossless":
+        return lambda path: process_image(path, lossless=True)
+    return convert_image_to_base64
+
+def video_stage(stage):
+    metadata = {"title": "Benchmark", "comment": "florianistudio-bench"}
+    if stage == "get_video_metadata":
+        return get_video_metadata
+    if stage == "get_video_metadata_native":
+        return lambda path: get_video_metadata(path, native=True)
+    if stage == "update_video_metadata":
+        return lambda path: update_video_metadata(path, metadata, f"{os.path.splitext(path)[0]}_edited.mp4")
+    return lambda path: update_video_metadata(path, metadata, f"{os.path.splitext(path)[0]}_edited.mp4", native=False)
+
+def stage_func(kind, stage, logo):
+    return image_stage(stage, logo) if kind == "image" else video_stage(stage)
+
+def _is_error(result):
+    return isinstance(result, dict) and bool(result.get("error"))
+
+def run_stage(stage, func, paths, repeat, profile_dir=None):
+    input_bytes = sum(os.path.getsize(path) for path in paths) * repeat
+    baseline_rss = peak_rss_mb()
+    # Cold pass: the first call pays for the logo load and the watermark
+    # layer/tile caches, so it is timed apart from the steady state.
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            func(path)
+        except Exception:
+            pass
+    cold_seconds = time.perf_counter() - start
+    profiler = cProfile.Profile() if profile_dir else None
+    errors = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            if profiler:
+                profiler.enable()
+            try:
+                result = func(path)
+            except Exception as e:
+                result = {"error": str(e)}
+            if profiler:
+                profiler.disable()
+            if _is_error(result):
+                errors.append({"file": os.path.basename(path), "error": str(result["error"])})
+    seconds = time.perf_counter() - start
+    if profiler:
+        profiler.dump_stats(os.path.join(profile_dir, f"{stage}.prof"))
+    items = len(paths) * repeat
+    return {
+        "stage": stage,
+        "items": items,
+        "cold_seconds": round(cold_seconds, 4),
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 2) if seconds else None,
+        "mb_per_second": round(input_bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "errors": errors[:5],
+        "error_count": len(errors),
+    }
+
+def _isolated_stage(kind, stage, logo, paths, repeat, profile_dir):
+    with contextlib.redirect_stdout(sys.stderr):
+        return run_stage(stage, stage_func(kind, stage, logo), paths, repeat, profile_dir)
+
+def run_isolated(kind, stage, logo, paths, repeat, profile_dir=None):
+    # ru_maxrss is a process-wide high-water mark, so each stage runs in a
+    # fresh process to make peak_rss_mb its own; baseline_rss_mb is that
+    # process after imports.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_isolated_stage, kind, stage, logo, paths, repeat, profile_dir).result()
+
+def run(args, workdir):
+    results = []
+    if not args.skip_images:
+        images = make_image_corpus(workdir, args.sizes, args.count)
+        for stage in args.image_stages:
+            for name in args.sizes:
+                for variant in ("plain", "exif"):
+                    subset = [path for path in images if os.path.basename(path).startswith(f"{name}-") and path.endswith(f"-{variant}.jpg")]
+                    result = run_isolated("image", stage, args.logo, subset, args.repeat, args.profile_dir and _stage_dir(args.profile_dir, f"{name}-{variant}"))
+                    results.append({"corpus": f"{name}-{variant}", **result})
+    if not args.skip_videos:
+        videos = make_video_corpus(workdir, args.videos, args.video_seconds, args.ffmpeg)
+        for stage in args.video_stages:
+            for name, path in zip(args.videos, videos):
+                result = run_isolated("video", stage, None, [path], args.repeat, args.profile_dir and _stage_dir(args.profile_dir, f"video-{name}"))
+                results.append({"corpus": f"video-{name}", **result})
+    return results
+
+def _stage_dir(profile_dir, corpus):
+    path = os.path.join(profile_dir, corpus)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def versions():
+    import PIL
+
+    info = {"python": sys.version.split()[0], "pillow": PIL.__version__, "piexif": getattr(piexif, "VERSION", None)}
+    try:
+        output = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout
+        info["ffmpeg"] = output.split("\n", 1)[0]
+    except OSError:
+        info["ffmpeg"] = None
+    return info
+
+def reexec_under_py_spy(argv, output):
+    argv = [arg for arg in argv if arg != "--py-spy"]
+    cmd = ["py-spy", "record", "--format", "speedscope", "-o", output, "--", sys.executable, os.path.abspath(__file__), *argv]
+    return subprocess.call(cmd)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Vazão por etapa dos pipelines de imagem e vídeo em corpora sintéticos.")
+    parser.add_argument("--sizes", nargs="+", default=["2mp", "12mp"], choices=sorted(SYNTHETIC_SIZES))
+    parser.add_argument("--count", type=int, default=2, help="Imagens por tamanho (cada uma com e sem EXIF)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições de cada etapa")
+    parser.add_argument("--image-stages", nargs="+", default=IMAGE_STAGES, choices=IMAGE_STAGES)
+    parser.add_argument("--video-stages", nargs="+", default=VIDEO_STAGES, choices=VIDEO_STAGES)
+    parser.add_argument("--videos", nargs="+", default=["720p"], choices=sorted(VIDEO_PRESETS))
+    parser.add_argument("--video-seconds", type=int, default=10, help="Duração dos vídeos testsrc")
+    parser.add_argument("--skip-images", action="store_true")
+    parser.add_argument("--skip-videos", action="store_true")
+    parser.add_argument("--logo", default=DEFAULT_LOGO, help="Imagem da marca d'água")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Executável usado para gerar os vídeos de teste")
+    parser.add_argument("--workdir", default=None, help="Pasta do corpus (padrão: temporária, apagada ao final)")
+    parser.add_argument("--profile-dir", default=None, help="Grava um .prof do cProfile por etapa nesta pasta")
+    parser.add_argument("--py-spy", action="store_true", help="Executa sob py-spy record (requer py-spy no PATH)")
+    parser.add_argument("--py-spy-output", default="pipelines.speedscope.json")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args(argv)
+    if args.py_spy:
+        return reexec_under_py_spy(argv, args.py_spy_output)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="florianistudio-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        # The pipelines print progress messages; keep stdout clean for the JSON.
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report = {"benchmark": "pipelines", "time": round(time.time(), 3), "versions": versions(), "results": results}
+    encoded = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+    else:
+        print(encoded)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
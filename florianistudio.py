@@ -1,43 +1,311 @@
-import flet as ft
-from PIL import Image, ImageEnhance
+from PIL import Image, ImageEnhance, JpegImagePlugin, features
 import piexif
 from datetime import datetime
 import os
 import base64
+import io
+import math
+import shutil
+import struct
 import webbrowser
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from metrics import metrics
 
-def apply_watermark(file_path, watermark_path):
-    img = Image.open(file_path).convert("RGBA")
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WATERMARK_OPACITY = 0.4
+WATERMARK_SCALE = 0.18
+WATERMARK_BACKEND = "auto"
+WATERMARK_NUMPY_MIN_PIXELS = 24_000_000
+WATERMARK_STRIP_HEIGHT = 256
+# Per-worker memory budget (bytes) for one image; above it the watermark is
+# composited strip by strip. None disables the check.
+WORKER_MEMORY_BUDGET = 512 * 1024 * 1024
+WATERMARK_CACHE_MAX_ENTRIES = 8
+WATERMARK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_watermark_layer_cache = OrderedDict()
+_watermark_layer_cache_bytes = 0
+_watermark_layer_cache_lock = threading.Lock()
+
+PREVIEW_SIZE = (400, 300)
+PREVIEW_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PREVIEW_TILE_EXTENT = 250
+
+_preview_cache = OrderedDict()
+_preview_cache_bytes = 0
+_preview_cache_lock = threading.Lock()
+
+def _prepare_watermark_tile(watermark_path, size, opacity, scale):
+    img_width, img_height = size
     watermark = Image.open(watermark_path).convert("RGBA")
-    img_width, img_height = img.size
     diagonal = (img_width**2 + img_height**2) ** 0.5
-    watermark_size = int(diagonal * 0.18)
+    watermark_size = int(diagonal * scale)
     watermark = watermark.resize((watermark_size, watermark_size), Image.LANCZOS)
     alpha = watermark.split()[3]
-    alpha = ImageEnhance.Brightness(alpha).enhance(0.4)
+    alpha = ImageEnhance.Brightness(alpha).enhance(opacity)
     watermark.putalpha(alpha)
     watermark = watermark.rotate(45, expand=True)
-    watermark_layer = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    for y in range(-watermark_size, img_height, int(watermark_size * 0.9)):
-        for x in range(-watermark_size, img_width, int(watermark_size * 0.9)):
+    return watermark, watermark_size, int(watermark_size * 0.9)
+
+def render_watermark_layer(watermark_path, size, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE):
+    img_width, img_height = size
+    watermark, watermark_size, step = _prepare_watermark_tile(watermark_path, size, opacity, scale)
+    watermark_layer = Image.new("RGBA", size, (0, 0, 0, 0))
+    for y in range(-watermark_size, img_height, step):
+        for x in range(-watermark_size, img_width, step):
             watermark_layer.paste(watermark, (x, y), watermark)
+    return watermark_layer
+
+def render_watermark_cell(watermark_path, size, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE):
+    # The tiled layer is periodic with period `step`, and every tile covering a
+    # visible pixel is pasted in the same row-major order, so one fully
+    # overlapped step x step cell rendered on a small canvas reproduces the
+    # Pillow layer exactly. Returns the RGBA cell and the layer's phase offset.
+    watermark, watermark_size, step = _prepare_watermark_tile(watermark_path, size, opacity, scale)
+    origin = -(-watermark.size[0] // step) * step
+    canvas_size = origin + step
+    canvas = Image.new("RGBA", (canvas_size, canvas_size), (0, 0, 0, 0))
+    for y in range(0, canvas_size, step):
+        for x in range(0, canvas_size, step):
+            canvas.paste(watermark, (x, y), watermark)
+    cell = np.array(canvas.crop((origin, origin, canvas_size, canvas_size)))
+    return cell, watermark_size % step
+
+def _cache_nbytes(value):
+    if isinstance(value, tuple):
+        return _cache_nbytes(value[0])
+    if isinstance(value, Image.Image):
+        return value.size[0] * value.size[1] * len(value.getbands())
+    return value.nbytes
+
+def _cached(key, build):
+    global _watermark_layer_cache_bytes
+    with _watermark_layer_cache_lock:
+        entry = _watermark_layer_cache.get(key)
+        if entry is not None:
+            _watermark_layer_cache.move_to_end(key)
+            return entry[0]
+    value = build()
+    nbytes = _cache_nbytes(value)
+    if nbytes > WATERMARK_CACHE_MAX_BYTES:
+        return value
+    with _watermark_layer_cache_lock:
+        if key not in _watermark_layer_cache:
+            _watermark_layer_cache[key] = (value, nbytes)
+            _watermark_layer_cache_bytes += nbytes
+        while (len(_watermark_layer_cache) > WATERMARK_CACHE_MAX_ENTRIES
+               or _watermark_layer_cache_bytes > WATERMARK_CACHE_MAX_BYTES):
+            _, (_, evicted_bytes) = _watermark_layer_cache.popitem(last=False)
+            _watermark_layer_cache_bytes -= evicted_bytes
+    return value
+
+def _watermark_cache_key(watermark_path, size, opacity, scale):
+    stat = os.stat(watermark_path)
+    return (os.path.abspath(watermark_path), stat.st_ino, stat.st_size, stat.st_mtime_ns, size[0], size[1], opacity, scale)
+
+def get_watermark_layer(watermark_path, size, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE):
+    key = ("layer",) + _watermark_cache_key(watermark_path, size, opacity, scale)
+    return _cached(key, lambda: render_watermark_layer(watermark_path, size, opacity, scale))
+
+def get_watermark_tile(watermark_path, size, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE):
+    key = ("tile",) + _watermark_cache_key(watermark_path, size, opacity, scale)
+    return _cached(key, lambda: _prepare_watermark_tile(watermark_path, size, opacity, scale))
+
+def get_watermark_cell(watermark_path, size, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE):
+    key = ("cell",) + _watermark_cache_key(watermark_path, size, opacity, scale)
+    return _cached(key, lambda: render_watermark_cell(watermark_path, size, opacity, scale))
+
+def _blend_over_rgb(rgb, overlay):
+    # Same integer math as Pillow's alpha_composite over an opaque base.
+    mask = overlay[..., 3] > 0
+    if not mask.any():
+        return
+    src = overlay[mask].astype(np.uint32)
+    dst = rgb[mask].astype(np.uint32)
+    alpha = src[:, 3:4]
+    blended = ((src[:, :3] * alpha + dst * (255 - alpha)) << 7) + (0x80 << 7)
+    blended = (((blended >> 8) + blended) >> 8) >> 7
+    rgb[mask] = blended.astype(np.uint8)
+
+def _watermark_image_numpy(img, watermark_path, opacity, scale):
+    rgb = np.array(img.convert("RGB"))
+    height, width = rgb.shape[:2]
+    cell, offset = get_watermark_cell(watermark_path, (width, height), opacity, scale)
+    step = cell.shape[0]
+    reps_x = -(-(width + offset) // step)
+    row_band = np.tile(cell, (1, reps_x, 1))[:, offset:offset + width]
+    for y0 in range(0, height, WATERMARK_STRIP_HEIGHT):
+        y1 = min(y0 + WATERMARK_STRIP_HEIGHT, height)
+        rows = (np.arange(y0, y1) + offset) % step
+        _blend_over_rgb(rgb[y0:y1], row_band[rows])
+    return Image.fromarray(rgb, "RGB")
+
+def _watermark_image_strips(img, watermark_path, opacity, scale, in_place=False):
+    # Pastes only the tiles that overlap each band, in the same order as
+    # render_watermark_layer, so the output matches the full-layer path
+    # while never holding more than one band of RGBA data.
+    width, height = img.size
+    if in_place and img.mode == "RGB":
+        rgb = img
+    else:
+        rgb = img.convert("RGB")
+    tile, watermark_size, step = get_watermark_tile(watermark_path, img.size, opacity, scale)
+    tile_height = tile.size[1]
+    for y0 in range(0, height, WATERMARK_STRIP_HEIGHT):
+        y1 = min(y0 + WATERMARK_STRIP_HEIGHT, height)
+        band_layer = Image.new("RGBA", (width, y1 - y0), (0, 0, 0, 0))
+        for y in range(-watermark_size, height, step):
+            if y >= y1 or y + tile_height <= y0:
+                continue
+            for x in range(-watermark_size, width, step):
+                band_layer.paste(tile, (x, y - y0), tile)
+        band = Image.alpha_composite(img.crop((0, y0, width, y1)).convert("RGBA"), band_layer)
+        rgb.paste(band.convert("RGB"), (0, y0))
+    return rgb
+
+def estimate_watermark_memory(size, mode="RGB", backend="pillow"):
+    pixels = size[0] * size[1]
+    decoded = pixels * Image.getmodebands(mode)
+    if backend == "strips":
+        band = size[0] * WATERMARK_STRIP_HEIGHT * 4 * 3
+        return decoded + pixels * 3 + band
+    if backend == "numpy":
+        return decoded + pixels * 3
+    # RGBA copy, cached layer, composite result and the final RGB copy.
+    return decoded + pixels * (4 + 4 + 4 + 3)
+
+def choose_watermark_backend(img, backend=None, memory_budget=None):
+    backend = backend or WATERMARK_BACKEND
+    if backend != "auto":
+        return backend
+    if memory_budget and estimate_watermark_memory(img.size, img.mode, "pillow") > memory_budget:
+        return "strips"
+    return "numpy" if img.size[0] * img.size[1] >= WATERMARK_NUMPY_MIN_PIXELS else "pillow"
+
+def image_has_alpha(img):
+    return "A" in img.getbands() or "transparency" in img.info
+
+def watermark_image(img, watermark_path, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE, backend=None, memory_budget=None, in_place=False, keep_alpha=False):
+    backend = choose_watermark_backend(img, backend, memory_budget)
+    has_alpha = image_has_alpha(img)
+    keep_alpha = keep_alpha and has_alpha
+    if backend == "strips" and not keep_alpha:
+        return _watermark_image_strips(img, watermark_path, opacity, scale, in_place)
+    if backend == "numpy" and np is not None and not has_alpha:
+        return _watermark_image_numpy(img, watermark_path, opacity, scale)
+    img = img.convert("RGBA")
+    watermark_layer = get_watermark_layer(watermark_path, img.size, opacity, scale)
     watermarked_image = Image.alpha_composite(img, watermark_layer)
-    watermarked_image = watermarked_image.convert("RGB")
+    return watermarked_image if keep_alpha else watermarked_image.convert("RGB")
+
+OUTPUT_PROFILES = {
+    "default": {},
+    "web-fast": {"quality": 80, "subsampling": "4:2:0"},
+    "web": {"quality": 82, "subsampling": "4:2:0", "optimize": True, "progressive": True},
+    "archive": {"quality": 95, "subsampling": "4:4:4", "optimize": True},
+    "keep-source-quality": {"keep_source": True, "quality": 90, "optimize": True},
+}
+DEFAULT_OUTPUT_PROFILE = "default"
+
+def source_jpeg_settings(img):
+    if img.format != "JPEG" or not getattr(img, "quantization", None):
+        return None
+    return {"qtables": img.quantization, "subsampling": JpegImagePlugin.get_sampling(img)}
+
+def jpeg_save_options(profile=None, source_settings=None):
+    options = dict(OUTPUT_PROFILES[profile or DEFAULT_OUTPUT_PROFILE])
+    if options.pop("keep_source", False) and source_settings:
+        # With explicit qtables Pillow must not rescale them by quality.
+        options.pop("quality", None)
+        options["qtables"] = source_settings["qtables"]
+        if source_settings["subsampling"] != -1:
+            options["subsampling"] = source_settings["subsampling"]
+    return options
+
+OUTPUT_FORMATS = {
+    "jpeg": {"format": "JPEG", "extension": ".jpg", "alpha": False, "feature": None},
+    "png": {"format": "PNG", "extension": ".png", "alpha": True, "feature": None},
+    "webp": {"format": "WEBP", "extension": ".webp", "alpha": True, "feature": "webp"},
+    "avif": {"format": "AVIF", "extension": ".avif", "alpha": True, "feature": "avif"},
+}
+# Per-writer settings for each OUTPUT_PROFILES name (which stay JPEG options);
+# profiles missing here use the writer's "default" entry.
+WRITER_PROFILES = {
+    "png": {
+        "default": {"compress_level": 6},
+        "web-fast": {"compress_level": 1},
+        "web": {"optimize": True},
+        "archive": {"compress_level": 9},
+    },
+    # method 6 / low AVIF speeds cost several times the encode time for a
+    # few percent, and method 6 is pathologically slow on alpha images.
+    "webp": {
+        "default": {"quality": 80, "method": 4},
+        "web-fast": {"quality": 75, "method": 2},
+        "web": {"quality": 80, "method": 4},
+        "archive": {"lossless": True, "quality": 80, "method": 4},
+    },
+    "avif": {
+        "default": {"quality": 60, "speed": 8},
+        "web-fast": {"quality": 55, "speed": 10},
+        "web": {"quality": 60, "speed": 6},
+        "archive": {"quality": 90, "speed": 6},
+    },
+}
+SOURCE_OUTPUT_FORMATS = {"JPEG": "jpeg", "MPO": "jpeg", "PNG": "png", "WEBP": "webp", "AVIF": "avif"}
+EXTENSION_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".jpe": "jpeg", ".png": "png", ".webp": "webp", ".avif": "avif"}
+
+def available_output_formats():
+    return [name for name, writer in OUTPUT_FORMATS.items() if not writer["feature"] or features.check(writer["feature"])]
+
+def resolve_output_format(img, output_format=None):
+    # "auto" keeps the input's format, so a PNG stays a PNG; formats Pillow
+    # cannot write (GIF, BMP, ...) fall back to JPEG.
+    if not output_format or output_format == "auto":
+        output_format = SOURCE_OUTPUT_FORMATS.get(img.format, "jpeg")
+    if output_format not in available_output_formats():
+        raise ValueError(f"Formato de saída indisponível nesta instalação do Pillow: {output_format}")
+    return output_format
+
+def writer_save_options(output_format, profile=None, source_settings=None):
+    if output_format == "jpeg":
+        return jpeg_save_options(profile, source_settings)
+    profiles = WRITER_PROFILES[output_format]
+    return dict(profiles.get(profile or DEFAULT_OUTPUT_PROFILE, profiles["default"]))
+
+def output_extension(ext, output_format):
+    if EXTENSION_FORMATS.get(ext.lower()) == output_format:
+        return ext
+    return OUTPUT_FORMATS[output_format]["extension"]
+
+def save_output(img, output_path, output_format, **options):
+    writer = OUTPUT_FORMATS[output_format]
+    if writer["alpha"] and image_has_alpha(img):
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    img.save(output_path, writer["format"], **options)
+
+def apply_watermark(file_path, watermark_path, opacity=WATERMARK_OPACITY, scale=WATERMARK_SCALE, profile=None, output_format=None):
+    img = Image.open(file_path)
+    output_format = resolve_output_format(img, output_format)
+    save_options = writer_save_options(output_format, profile, source_jpeg_settings(img))
+    watermarked_image = watermark_image(img, watermark_path, opacity, scale, keep_alpha=OUTPUT_FORMATS[output_format]["alpha"])
     base_name, ext = os.path.splitext(file_path)
-    output_path = f"{base_name}_watermarked{ext}"
-    watermarked_image.save(output_path, "jpeg")
+    output_path = f"{base_name}_watermarked{output_extension(ext, output_format)}"
+    save_output(watermarked_image, output_path, output_format, **save_options)
     return output_path
 
-def process_image(file_path):
-    img = Image.open(file_path)
-    img = img.convert("RGB")
-    exif_data_before = img.info.get("exif")
-    exif_dict_before = piexif.load(exif_data_before) if exif_data_before else {}
-    exif_dict = piexif.load(exif_data_before) if exif_data_before else {"0th": {}, "Exif": {}, "1st": {}, "GPS": {}, "Interop": {}, "thumbnail": None}
-    for key in exif_dict.keys():
-        exif_dict[key] = {}
+def build_exif_dict():
     current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    exif_dict = {
+    return {
         "0th": {
             piexif.ImageIFD.Artist: "Felipe Floriani Lopes da Nobrega",
             piexif.ImageIFD.ImageDescription: f"Criado em {current_datetime} - FlorianiStudio".encode('utf-8'),
@@ -51,22 +319,369 @@ def process_image(file_path):
         "Interop": {},
         "thumbnail": None,
     }
-    exif_dict_after = exif_dict
-    exif_bytes = piexif.dump(exif_dict)
+
+def read_exif_dict(img):
+    exif_data = img.info.get("exif")
+    return piexif.load(exif_data) if exif_data else {}
+
+JPEG_SOI = b"\xff\xd8"
+EXIF_HEADER = b"Exif\x00\x00"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def is_jpeg(file_path):
+    with open(file_path, "rb") as f:
+        return f.read(2) == JPEG_SOI
+
+def splice_exif(file_path, output_path, exif_bytes):
+    # Rewrites only the APP1/Exif segment; the entropy-coded image data is
+    # streamed through untouched.
+    if len(exif_bytes) + 2 > 0xFFFF:
+        raise ValueError("Bloco EXIF grande demais para um segmento APP1.")
+    exif_segment = b"\xff\xe1" + struct.pack(">H", len(exif_bytes) + 2) + exif_bytes
+    exif_data_before = None
+    with open(file_path, "rb") as src, open(output_path, "wb") as dst:
+        if src.read(2) != JPEG_SOI:
+            raise ValueError("Arquivo não é um JPEG válido.")
+        dst.write(JPEG_SOI)
+        inserted = False
+        while True:
+            marker = src.read(2)
+            while len(marker) == 2 and marker[1] == 0xFF:
+                marker = marker[1:] + src.read(1)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError("Estrutura JPEG inválida.")
+            code = marker[1]
+            if not (0xE0 <= code <= 0xEF or code == 0xFE):
+                if not inserted:
+                    dst.write(exif_segment)
+                dst.write(marker)
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                break
+            length_bytes = src.read(2)
+            (length,) = struct.unpack(">H", length_bytes)
+            payload = src.read(length - 2)
+            if code == 0xE1 and payload.startswith(EXIF_HEADER):
+                if exif_data_before is None:
+                    exif_data_before = payload
+                continue
+            if code != 0xE0 and not inserted:
+                dst.write(exif_segment)
+                inserted = True
+            dst.write(marker + length_bytes + payload)
+    return exif_data_before
+
+def output_base(file_path, output_dir=None):
     base_name, ext = os.path.splitext(file_path)
+    if output_dir:
+        base_name = os.path.join(output_dir, os.path.basename(base_name))
+    return base_name, ext
+
+def process_image_metadata_only(file_path, exif_spec=None, output_dir=None):
+    exif_dict_after = exif_spec if exif_spec is not None else build_exif_dict()
+    base_name, ext = output_base(file_path, output_dir)
     output_path = f"{base_name}_Mfix{ext}"
-    img.save(output_path, "jpeg", exif=exif_bytes)
+    exif_data_before = splice_exif(file_path, output_path, piexif.dump(exif_dict_after))
+    exif_dict_before = piexif.load(exif_data_before) if exif_data_before else {}
+    return output_path, exif_dict_before, exif_dict_after
+
+def process_image(file_path, lossless=False, profile=None, output_format=None):
+    if lossless and is_jpeg(file_path) and output_format in (None, "auto", "jpeg"):
+        return process_image_metadata_only(file_path)
+    img = Image.open(file_path)
+    output_format = resolve_output_format(img, output_format)
+    save_options = writer_save_options(output_format, profile, source_jpeg_settings(img))
+    exif_dict_before = read_exif_dict(img)
+    exif_dict_after = build_exif_dict()
+    exif_bytes = piexif.dump(exif_dict_after)
+    base_name, ext = os.path.splitext(file_path)
+    output_path = f"{base_name}_Mfix{output_extension(ext, output_format)}"
+    save_output(img, output_path, output_format, exif=exif_bytes, **save_options)
     return output_path, exif_dict_before, exif_dict_after
 
+RENDITION_SIZES = {"full": None, "web": 2048, "thumb": 400}
+
+def resolve_renditions(renditions):
+    if not renditions:
+        return {"full": None}
+    if isinstance(renditions, dict):
+        return dict(renditions)
+    return {name: RENDITION_SIZES[name] for name in renditions}
+
+def rendition_size(size, long_edge):
+    if not long_edge or max(size) <= long_edge:
+        return size
+    scale = long_edge / max(size)
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+def open_for_renditions(file_path, long_edges):
+    img = Image.open(file_path)
+    if None not in long_edges:
+        # DCT-domain downscale (1/2, 1/4 or 1/8) to the smallest size that
+        # still covers the largest rendition; a no-op for non-JPEG input.
+        img.draft("RGB", rendition_size(img.size, max(long_edges)))
+    return img
+
+def _process_file(file_path, watermark_path=None, exif_spec=None, keep_intermediate=False, backend=None, preview_size=None, profile=None, renditions=None, output_dir=None, memory_budget=None, output_format=None):
+    if not watermark_path and exif_spec is None:
+        raise ValueError("Nenhuma marca d'água ou metadado para aplicar.")
+    renditions = resolve_renditions(renditions)
+    bytes_in = os.path.getsize(file_path)
+    if not watermark_path and list(renditions.values()) == [None] and output_format in (None, "auto", "jpeg") and is_jpeg(file_path):
+        with metrics.stage("exif", file_path, bytes_in=bytes_in) as info:
+            output_path, exif_dict_before, exif_dict_after = process_image_metadata_only(file_path, exif_spec, output_dir)
+            info["bytes_out"] = os.path.getsize(output_path)
+        preview = None
+        if preview_size:
+            with metrics.stage("preview", file_path):
+                preview = load_preview(output_path, preview_size)
+        return {"output_path": output_path, "outputs": {"full": output_path}, "exif_before": exif_dict_before, "exif_after": exif_dict_after, "preview": preview}
+    with metrics.stage("decode", file_path, bytes_in=bytes_in):
+        img = open_for_renditions(file_path, list(renditions.values()))
+        img.load()
+    output_format = resolve_output_format(img, output_format)
+    keep_alpha = OUTPUT_FORMATS[output_format]["alpha"]
+    save_options = writer_save_options(output_format, profile, source_jpeg_settings(img))
+    base_name, ext = output_base(file_path, output_dir)
+    ext = output_extension(ext, output_format)
+    suffix = "_watermarked" if watermark_path else ""
+    with metrics.stage("exif", file_path):
+        exif_data_before = img.info.get("exif")
+        exif_dict_before = read_exif_dict(img)
+        if exif_spec is not None:
+            exif_dict_after = exif_spec
+            exif_bytes = piexif.dump(exif_spec)
+        else:
+            exif_dict_after = exif_dict_before
+            exif_bytes = exif_data_before
+    if exif_bytes:
+        save_options["exif"] = exif_bytes
+    outputs = {}
+    source = img
+    rendition = None
+    ordered = sorted(renditions.items(), key=lambda item: -(item[1] or float("inf")))
+    for index, (name, long_edge) in enumerate(ordered):
+        name_suffix = "" if name == "full" else f"_{name}"
+        size = rendition_size(source.size, long_edge)
+        if size != source.size:
+            with metrics.stage("resize", file_path, rendition=name):
+                source = source.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        if watermark_path:
+            with metrics.stage("watermark", file_path, rendition=name):
+                # The smallest rendition is the last user of `source`, so the
+                # strip backend may composite into it instead of copying.
+                rendition = watermark_image(
+                    source, watermark_path, backend=backend,
+                    memory_budget=memory_budget or WORKER_MEMORY_BUDGET, in_place=index == len(ordered) - 1,
+                    keep_alpha=keep_alpha
+                )
+            if keep_intermediate:
+                save_output(rendition, f"{base_name}{suffix}{name_suffix}{ext}", output_format, **{k: v for k, v in save_options.items() if k != "exif"})
+        else:
+            rendition = source
+        output_path = f"{base_name}{suffix}{'_Mfix' if exif_spec is not None else ''}{name_suffix}{ext}"
+        with metrics.stage("encode", file_path, rendition=name) as info:
+            save_output(rendition, output_path, output_format, **save_options)
+            info["bytes_out"] = os.path.getsize(output_path)
+            info["format"] = output_format
+        outputs[name] = output_path
+    preview = None
+    if preview_size:
+        with metrics.stage("preview", file_path):
+            preview = make_preview(rendition, preview_size)
+    primary = outputs.get("full") or next(iter(outputs.values()))
+    return {"output_path": primary, "outputs": outputs, "exif_before": exif_dict_before, "exif_after": exif_dict_after, "preview": preview}
+
+def process_file(file_path, watermark_path=None, exif_spec=None, keep_intermediate=False, backend=None, profile=None, renditions=None, output_format=None):
+    result = _process_file(file_path, watermark_path, exif_spec, keep_intermediate, backend, profile=profile, renditions=renditions, output_format=output_format)
+    return result["output_path"], result["exif_before"], result["exif_after"]
+
+# The default description embeds the run timestamp, so it must not make every
+# run look like a new operation to the output cache.
+EXIF_VOLATILE_TAGS = {("0th", piexif.ImageIFD.ImageDescription)}
+UNCACHED_OPTIONS = {"backend", "preview_size", "memory_budget"}
+
+def image_operation_params(watermark_path, exif_spec, options):
+    logo = None
+    if watermark_path:
+        stat = os.stat(watermark_path)
+        logo = [os.path.abspath(watermark_path), stat.st_size, stat.st_mtime_ns, WATERMARK_OPACITY, WATERMARK_SCALE]
+    exif = None
+    if exif_spec is not None:
+        exif = {
+            ifd: {tag: value for tag, value in tags.items() if (ifd, tag) not in EXIF_VOLATILE_TAGS} if isinstance(tags, dict) else tags
+            for ifd, tags in exif_spec.items()
+        }
+    return {
+        "op": "image",
+        "logo": logo,
+        "exif": exif,
+        "options": {key: value for key, value in options.items() if key not in UNCACHED_OPTIONS},
+    }
+
+def _process_file_job(file_path, watermark_path, exif_spec, options):
+    # Stage records are captured here and replayed by the parent, so sinks
+    # configured in the main process also see work done in pool workers.
+    with metrics.capture() as records:
+        try:
+            with metrics.stage("image", file_path):
+                result = _process_file(file_path, watermark_path, exif_spec, **options)
+            result = {"file_path": file_path, **result, "cached": False, "error": None}
+        except Exception as e:
+            result = {"file_path": file_path, "output_path": None, "outputs": {}, "exif_before": {}, "exif_after": {}, "preview": None, "cached": False, "error": str(e)}
+    result["metrics"] = records
+    return result
+
+def _cached_result(file_path, output_path, outputs, preview_size=None):
+    try:
+        with Image.open(file_path) as img:
+            exif_before = read_exif_dict(img)
+        with Image.open(output_path) as img:
+            exif_after = read_exif_dict(img)
+        preview = load_preview(output_path, preview_size) if preview_size else None
+        return {"file_path": file_path, "output_path": output_path, "outputs": outputs, "exif_before": exif_before, "exif_after": exif_after, "preview": preview, "cached": True, "error": None, "metrics": []}
+    except Exception as e:
+        return {"file_path": file_path, "output_path": None, "outputs": {}, "exif_before": {}, "exif_after": {}, "preview": None, "cached": True, "error": str(e), "metrics": []}
+
+def _finish_job(result, queued):
+    metrics.replay(result["metrics"])
+    metrics.gauge("image_queue_depth", queued)
+    metrics.count("images_processed", status="error" if result["error"] else "ok")
+    return result
+
+def physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+# Total estimated peak allowed across in-flight batch workers.
+BATCH_MEMORY_BUDGET = (physical_memory() or 0) // 2 or None
+
+def estimate_job_memory(file_path, watermark_path=None, memory_budget=None):
+    try:
+        with Image.open(file_path) as img:
+            size, mode = img.size, img.mode
+    except Exception:
+        return 0
+    if not watermark_path:
+        return size[0] * size[1] * (Image.getmodebands(mode) + 3)
+    memory_budget = memory_budget or WORKER_MEMORY_BUDGET
+    estimate = estimate_watermark_memory(size, mode, "pillow")
+    if memory_budget and estimate > memory_budget:
+        estimate = estimate_watermark_memory(size, mode, "strips")
+    return estimate
+
+def _run_jobs(file_paths, watermark_path, exif_spec, jobs, max_in_flight, options, batch_memory_budget=None):
+    if jobs == 1:
+        for index, file_path in enumerate(file_paths):
+            yield _finish_job(_process_file_job(file_path, watermark_path, exif_spec, options), len(file_paths) - index - 1)
+        return
+    max_in_flight = max_in_flight or jobs * 2
+    batch_memory_budget = batch_memory_budget or BATCH_MEMORY_BUDGET
+    reserved = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        try:
+            for file_path in file_paths:
+                need = estimate_job_memory(file_path, watermark_path, options.get("memory_budget"))
+                # Admission control: a file is only submitted once its
+                # estimated peak fits next to the ones already in flight. The
+                # first one is always admitted so oversized files still run.
+                while pending and (len(pending) >= max_in_flight or (batch_memory_budget and sum(reserved.values()) + need > batch_memory_budget)):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        reserved.pop(future, None)
+                        yield _finish_job(future.result(), len(pending))
+                future = executor.submit(_process_file_job, file_path, watermark_path, exif_spec, options)
+                reserved[future] = need
+                pending.add(future)
+                metrics.gauge("image_queue_depth", len(pending))
+                metrics.gauge("image_memory_reserved_bytes", sum(reserved.values()))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    reserved.pop(future, None)
+                    yield _finish_job(future.result(), len(pending))
+        except GeneratorExit:
+            # The consumer stopped early (e.g. the GUI cancel button): drop
+            # queued files and only wait for the ones already running.
+            for future in pending:
+                future.cancel()
+            raise
+
+def run_batch(file_paths, watermark_path=None, exif_spec=None, jobs=None, max_in_flight=None, cache=None, batch_memory_budget=None, **options):
+    jobs = jobs or os.cpu_count() or 1
+    if cache is None:
+        yield from _run_jobs(file_paths, watermark_path, exif_spec, jobs, max_in_flight, options, batch_memory_budget)
+        return
+    params = image_operation_params(watermark_path, exif_spec, options)
+    remaining = []
+    for file_path in file_paths:
+        hit = cache.lookup_outputs(file_path, params)
+        # Entries without rendition rows predate multi-output recording and
+        # cannot vouch for the renditions, so they are redone.
+        if hit and hit[1]:
+            metrics.count("images_processed", status="cached")
+            yield _cached_result(file_path, *hit, options.get("preview_size"))
+        else:
+            remaining.append(file_path)
+    for result in _run_jobs(remaining, watermark_path, exif_spec, jobs, max_in_flight, options, batch_memory_budget):
+        if not result["error"]:
+            cache.record(result["file_path"], params, result["output_path"], result["outputs"])
+        yield result
+
 def convert_image_to_base64(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode('utf-8')
 
+def make_preview(img, size=PREVIEW_SIZE):
+    # Image.thumbnail uses JPEG draft mode on unloaded files and reduce() otherwise.
+    img.thumbnail(size)
+    buffer = io.BytesIO()
+    img.convert("RGB").save(buffer, "jpeg", quality=80)
+    return buffer.getvalue()
+
+def load_preview(file_path, size=PREVIEW_SIZE):
+    with Image.open(file_path) as img:
+        return make_preview(img, size)
+
+def cache_preview(file_path, preview):
+    global _preview_cache_bytes
+    with _preview_cache_lock:
+        if file_path in _preview_cache:
+            _preview_cache_bytes -= len(_preview_cache.pop(file_path))
+        _preview_cache[file_path] = preview
+        _preview_cache_bytes += len(preview)
+        while _preview_cache_bytes > PREVIEW_CACHE_MAX_BYTES and len(_preview_cache) > 1:
+            _, evicted = _preview_cache.popitem(last=False)
+            _preview_cache_bytes -= len(evicted)
+
+def get_preview(file_path, size=PREVIEW_SIZE):
+    with _preview_cache_lock:
+        preview = _preview_cache.get(file_path)
+        if preview is not None:
+            _preview_cache.move_to_end(file_path)
+            return preview
+    preview = load_preview(file_path, size)
+    cache_preview(file_path, preview)
+    return preview
+
+def clear_preview_cache():
+    global _preview_cache_bytes
+    with _preview_cache_lock:
+        _preview_cache.clear()
+        _preview_cache_bytes = 0
+
 def close_metadata_dialog(e, dialog):
     dialog.open = False
     e.page.update()
 
-def main(page: ft.Page):
+def main(page: "ft.Page"):
+    import flet as ft
+    from output_cache import OutputCache
+    from metadata_catalog import MetadataCatalog, exif_metadata
+    from ui_tasks import BackgroundTask, UpdateThrottle
+
     page.title = "Floriani Studio - Aplicador de Marca D'\u00e1gua e Editor de Metadados"
     page.window.width = 800
     page.window.height = 600
@@ -75,54 +690,120 @@ def main(page: ft.Page):
     page.theme_mode = ft.ThemeMode.LIGHT
     page.scroll = ft.ScrollMode.AUTO
     page.window_icon = "assets/icone.png"
+    output_cache = OutputCache()
+    catalog = MetadataCatalog()
     file_metadata = []
     preview_images = []
 
+    throttle = UpdateThrottle(page)
+
+    def on_task_state(busy):
+        pick_button.disabled = busy
+        cancel_button.visible = busy
+        cancel_button.disabled = False
+        progress_bar.visible = busy
+        throttle.request()
+
+    task = BackgroundTask(page, on_state=on_task_state)
+
     def on_files_upload(e):
         if e.files:
-            output_paths = []
-            preview_images.clear()
-            file_metadata.clear()
-            preview_gallery.controls.clear()
-            for file in e.files:
-                file_path = file.path
-                output_path_watermark = apply_watermark(file_path, "logo render.png")
-                if "Erro" in output_path_watermark:
-                    status_text.value = output_path_watermark
-                    page.update()
-                    return
-                output_path_metadata, exif_before, exif_after = process_image(output_path_watermark)
-                if "Erro" in output_path_metadata:
-                    status_text.value = output_path_metadata
-                    page.update()
-                    return
-                output_paths.append(output_path_metadata)
-                file_metadata.append((file_path, exif_before, exif_after))
-                preview_images.append(convert_image_to_base64(output_path_metadata))
-            status_text.value = "\n".join([f"Imagem processada e salva em: {path}" for path in output_paths])
-            if len(output_paths) > 0:
-                update_preview_gallery()
+            file_paths = [file.path for file in e.files]
+            if not task.start(process_uploads, file_paths):
+                status_text.value = "Já existe um processamento em andamento."
+        else:
+            status_text.value = "Nenhum arquivo selecionado."
+        page.update()
+
+    def process_uploads(cancel_event, file_paths):
+        output_paths = []
+        messages = []
+        errors = []
+        preview_images.clear()
+        # The previous gallery is discarded, so its previews are dead weight.
+        clear_preview_cache()
+        file_metadata.clear()
+        catalog_entries = []
+        preview_gallery.controls.clear()
+        progress_bar.value = 0
+        try:
+            for result in run_batch(file_paths, "logo render.png", build_exif_dict(), cache=output_cache, preview_size=PREVIEW_SIZE):
+                if result["error"]:
+                    errors.append(f"Erro ao processar {os.path.basename(result['file_path'])}: {result['error']}")
+                else:
+                    output_paths.append(result["output_path"])
+                    if result["cached"]:
+                        messages.append(f"Imagem já processada anteriormente: {result['output_path']}")
+                    else:
+                        messages.append(f"Imagem processada e salva em: {result['output_path']}")
+                    file_metadata.append((result["file_path"], result["output_path"]))
+                    # The batch already parsed both EXIF blocks, so the
+                    # catalog is filled from them instead of re-reading files.
+                    catalog_entries.append((result["file_path"], "image", exif_metadata(result["exif_before"]), None))
+                    after = exif_metadata(result["exif_after"])
+                    catalog_entries.extend((path, "image", after, None) for path in result["outputs"].values())
+                    cache_preview(result["output_path"], result["preview"])
+                    preview_images.append(result["output_path"])
+                done = len(output_paths) + len(errors)
+                progress_bar.value = done / len(file_paths)
+                status_text.value = f"Processando imagens... {done}/{len(file_paths)}"
+                throttle.request()
+                if cancel_event.is_set():
+                    messages.append(f"Processamento cancelado após {done}/{len(file_paths)} imagem(ns).")
+                    break
+        except Exception as err:
+            errors.append(f"Erro ao processar as imagens: {str(err)}")
+        try:
+            catalog.store_many(catalog_entries)
+        except Exception as err:
+            errors.append(f"Erro ao atualizar o catálogo de metadados: {str(err)}")
+        status_text.value = "\n".join(messages + errors)
+        if len(output_paths) > 0:
+            update_preview_gallery()
             open_folder_button.visible = True
             open_folder_button.data = os.path.dirname(output_paths[0])
             result_button.visible = True
-            page.update()
-        else:
-            status_text.value = "Nenhum arquivo selecionado."
+        throttle.flush()
+
+    def cancel_processing(e):
+        task.cancel()
+        cancel_button.disabled = True
+        status_text.value = "Cancelando após as imagens em andamento..."
         page.update()
 
     def update_preview_gallery():
         if len(preview_images) > 0:
             preview_gallery.controls = [
                 ft.Container(
-                    content=ft.Image(src_base64=img, width=200, height=150, fit=ft.ImageFit.CONTAIN),
+                    content=ft.Icon(ft.icons.IMAGE, color=ft.colors.GREY_400),
                     padding=5,
                     border_radius=ft.border_radius.all(10),
-                    bgcolor=ft.colors.GREY_200
-                ) for img in preview_images
+                    bgcolor=ft.colors.GREY_200,
+                    alignment=ft.alignment.center,
+                    data=path
+                ) for path in preview_images
             ]
             preview_gallery.visible = True
+            load_visible_previews(0, preview_gallery.height, update=False)
+
+    def load_visible_previews(offset, viewport, update=True):
+        row_extent = PREVIEW_TILE_EXTENT + preview_gallery.run_spacing
+        columns = max(1, math.ceil((page.window.width - 2 * page.padding) / (PREVIEW_TILE_EXTENT + preview_gallery.spacing)))
+        first_row = int(offset // row_extent)
+        last_row = int((offset + viewport) // row_extent) + 1
+        changed = False
+        for tile in preview_gallery.controls[first_row * columns:(last_row + 1) * columns]:
+            if isinstance(tile.content, ft.Image):
+                continue
+            preview = base64.b64encode(get_preview(tile.data)).decode('utf-8')
+            tile.content = ft.Image(src_base64=preview, width=200, height=150, fit=ft.ImageFit.CONTAIN)
+            changed = True
+        if changed and update:
             preview_gallery.update()
 
+    def on_gallery_scroll(e):
+        load_visible_previews(e.pixels, e.viewport_dimension)
+
     def open_folder(e):
         if e.control.data:
             webbrowser.open(f'file://{e.control.data}')
@@ -131,11 +812,11 @@ def main(page: ft.Page):
         if file_metadata:
             before_metadata_column = ft.Column(scroll='auto')
             after_metadata_column = ft.Column(scroll='auto')
-            for file_path, exif_before, exif_after in file_metadata:
+            for file_path, output_path in file_metadata:
                 before_metadata_column.controls.append(ft.Text(f"""Arquivo: {file_path}
-{format_exif(exif_before)}""", size=12))
+{format_exif(catalog.get(file_path, refresh=False))}""", size=12))
                 after_metadata_column.controls.append(ft.Text(f"""Arquivo: {file_path}
-{format_exif(exif_after)}""", size=12))
+{format_exif(catalog.get(output_path, refresh=False))}""", size=12))
             metadata_dialog.content = ft.Row([
                 ft.Container(content=before_metadata_column, width=350, padding=10, border_radius=ft.border_radius.all(10), bgcolor=ft.colors.GREY_200),
                 ft.VerticalDivider(width=10, color=ft.colors.GREY_400),
@@ -144,19 +825,16 @@ def main(page: ft.Page):
             metadata_dialog.open = True
             page.update()
 
-    def format_exif(exif_dict):
-        if not exif_dict:
-            return "Nenhum metadado"
+    def format_exif(metadata):
+        # metadata comes from the catalog: {ifd: {tag name: decoded text}}.
+        if metadata is None:
+            return "Metadados ainda não catalogados"
+        if "error" in metadata:
+            return f"Erro ao ler metadados: {metadata['error']}"
         formatted_exif = ""
-        for ifd, tags in exif_dict.items():
-            if tags:
-                for tag, value in tags.items():
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode('utf-16').strip('\x00')
-                        except UnicodeDecodeError:
-                            value = value.decode('utf-8', errors='replace')
-                    formatted_exif += f"{piexif.TAGS[ifd][tag]['name']}: {value}\n"
+        for tags in (metadata or {}).values():
+            for name, value in tags.items():
+                formatted_exif += f"{name}: {value}\n"
         return formatted_exif if formatted_exif else "Nenhum metadado"
 
     file_picker = ft.FilePicker(on_result=on_files_upload)
@@ -186,6 +864,13 @@ def main(page: ft.Page):
         animate_opacity=300,
         animate_scale=300
     )
+    cancel_button = ft.ElevatedButton(
+        "Cancelar",
+        icon=ft.icons.CANCEL,
+        visible=False,
+        on_click=cancel_processing
+    )
+    progress_bar = ft.ProgressBar(value=0, visible=False)
     preview_image = ft.Image(width=400, height=300, fit=ft.ImageFit.CONTAIN, src="")
     preview_card = ft.Card(
         content=ft.Container(
@@ -204,7 +889,10 @@ def main(page: ft.Page):
         runs_count=3,
         spacing=10,
         run_spacing=10,
-        max_extent=250
+        max_extent=PREVIEW_TILE_EXTENT,
+        height=400,
+        on_scroll=on_gallery_scroll,
+        on_scroll_interval=100
     )
     status_text = ft.Text(
         "Selecione uma ou mais imagens para começar.", 
@@ -233,6 +921,8 @@ def main(page: ft.Page):
 
     page.add(
         pick_button,
+        cancel_button,
+        progress_bar,
         open_folder_button,
         result_button,
         preview_card,
@@ -240,4 +930,12 @@ def main(page: ft.Page):
         status_card,
     )
 
-ft.app(target=main)
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        from florianistudio_cli import main as cli_main
+        sys.exit(cli_main())
+    import flet as ft
+    from metrics import configure_from_env
+    configure_from_env()
+    ft.app(target=main)
@@ -0,0 +1,331 @@
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import JsonLinesSink, MemorySink, PrometheusTextfileSink, configure_from_env, metrics
+from output_cache import DEFAULT_CACHE_PATH, OutputCache
+
+IMAGE_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.webp"]
+VIDEO_PATTERNS = ["*.mp4"]
+# Image outputs are named <stem>_watermarked/_Mfix[_<rendition>], where the
+# rendition name is free-form, so those markers count anywhere in the stem.
+OUTPUT_MARKERS = ("_watermarked", "_Mfix")
+OUTPUT_SUFFIXES = ("_edited", "_camuflage")
+DEFAULT_LOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo render.png")
+
+def emit(event, **fields):
+    record = {"event": event, "time": round(time.time(), 3), **fields}
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
+
+def _matches(name, patterns):
+    lower = name.lower()
+    return any(fnmatch.fnmatch(lower, pattern.lower()) for pattern in patterns)
+
+def _is_output(name):
+    stem = os.path.splitext(name)[0]
+    return any(marker in stem for marker in OUTPUT_MARKERS) or any(stem.endswith(suffix) for suffix in OUTPUT_SUFFIXES)
+
+def collect_files(paths, patterns, recursive=False, include_outputs=False):
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        if not os.path.isdir(path):
+            emit("error", file=path, error="Caminho não encontrado")
+            continue
+        if recursive:
+            walker = os.walk(path)
+        else:
+            walker = [(path, [], [entry.name for entry in os.scandir(path) if entry.is_file()])]
+        for root, dirs, names in walker:
+            dirs.sort()
+            for name in sorted(names):
+                if not _matches(name, patterns):
+                    continue
+                if not include_outputs and _is_output(name):
+                    continue
+                files.append(os.path.join(root, name))
+    return files
+
+def cmd_watermark(args):
+    from florianistudio import run_batch, build_exif_dict
+
+    files = collect_files(args.paths, args.glob or IMAGE_PATTERNS, args.recursive, args.include_outputs)
+    watermark_path = None if args.no_watermark else args.logo
+    exif_spec = None if args.no_exif else build_exif_dict()
+    cache = None if args.no_cache else OutputCache(args.cache)
+    emit("start", command="watermark", total=len(files))
+    failed = 0
+    for result in run_batch(files, watermark_path, exif_spec, jobs=args.jobs, cache=cache, backend=args.backend, profile=args.profile, output_format=args.format, renditions=_parse_renditions(args.rendition), memory_budget=_megabytes(args.memory_budget), batch_memory_budget=_megabytes(args.batch_memory)):
+        if result["error"]:
+            failed += 1
+        emit("result", file=result["file_path"], output=result["output_path"], outputs=result["outputs"], cached=result["cached"], error=result["error"])
+    emit("done", total=len(files), ok=len(files) - failed, failed=failed, stats=args.stats.summary())
+    return 1 if failed else 0
+
+def _megabytes(value):
+    return int(value * 1024 * 1024) if value else None
+
+def _parse_renditions(values):
+    from florianistudio import RENDITION_SIZES
+
+    if not values:
+        return None
+    renditions = {}
+    for value in values:
+        name, sep, long_edge = value.partition("=")
+        if sep:
+            renditions[name] = int(long_edge) if long_edge else None
+        elif name in RENDITION_SIZES:
+            renditions[name] = RENDITION_SIZES[name]
+        else:
+            raise SystemExit(f"Versão desconhecida: {name} (use full, web, thumb ou nome=LADO_MAIOR)")
+    return renditions
+
+def _parse_metadata(pairs):
+    metadata = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Metadado inválido (use chave=valor): {pair}")
+        metadata[key] = value
+    return metadata
+
+def _update_video(file_path, new_metadata, output_path, args, cache):
+    from mp4_metadata_editor import update_video_metadata, video_operation_params
+
+    params = video_operation_params(new_metadata, output_path, args.vf, args.af, args.preset, args.crf, args.watermark)
+    if args.dry_run:
+        result = update_video_metadata(
+            file_path, new_metadata, output_path, video_filters=args.vf, audio_filters=args.af, native=not args.ffmpeg,
+            preset=args.preset, crf=args.crf, dry_run=True, watermark_path=args.watermark
+        )
+        return {"file": file_path, "output": None, "plan": result["message"], "cached": False, "error": result["error"]}
+    if cache is not None and cache.lookup(file_path, params) == output_path:
+        return {"file": file_path, "output": output_path, "cached": True, "error": None}
+    result = update_video_metadata(
+        file_path, new_metadata, output_path, video_filters=args.vf, audio_filters=args.af, native=not args.ffmpeg,
+        preset=args.preset, crf=args.crf, watermark_path=args.watermark,
+        on_progress=lambda progress: emit("progress", file=file_path, **progress)
+    )
+    error = result["error"] if result["status"] == "error" else None
+    if cache is not None and not error:
+        cache.record(file_path, params, output_path)
+    return {"file": file_path, "output": None if error else output_path, "cached": False, "error": error}
+
+def cmd_watch(args):
+    from florianistudio import run_batch, build_exif_dict
+    from mp4_metadata_editor import generate_output_path
+    from watch_folder import FolderWatcher, run_watch
+
+    output_dir = os.path.abspath(args.output_dir)
+    if output_dir == os.path.abspath(args.folder):
+        raise SystemExit("--output-dir precisa ser diferente da pasta observada")
+    os.makedirs(output_dir, exist_ok=True)
+    watermark_path = None if args.no_watermark else args.logo
+    new_metadata = _parse_metadata(args.set)
+    cache = None if args.no_cache else OutputCache(args.cache)
+
+    def exclude(path):
+        path = os.path.abspath(path)
+        return path.startswith(output_dir + os.sep) or _is_output(os.path.basename(path))
+
+    def handle(path):
+        if _matches(os.path.basename(path), VIDEO_PATTERNS):
+            output_path = generate_output_path(path, args.suffix, output_dir)
+            emit("result", **_update_video(path, new_metadata, output_path, args, cache))
+            return
+        exif_spec = None if args.no_exif else build_exif_dict()
+        for result in run_batch([path], watermark_path, exif_spec, jobs=1, cache=cache, profile=args.profile, output_format=args.format, output_dir=output_dir, memory_budget=_megabytes(args.memory_budget)):
+            emit("result", file=result["file_path"], output=result["output_path"], cached=result["cached"], error=result["error"])
+
+    watcher = FolderWatcher(
+        args.folder, args.glob or IMAGE_PATTERNS + VIDEO_PATTERNS, exclude=exclude, recursive=args.recursive,
+        stable_seconds=args.stable_seconds, poll_interval=args.poll_interval, queue_size=args.queue_size, use_events=not args.poll
+    )
+    emit("start", command="watch", folder=watcher.folder, output_dir=output_dir, mode=watcher.mode)
+    try:
+        run_watch(watcher, handle, workers=args.jobs or 1)
+    except KeyboardInterrupt:
+        pass
+    emit("done", stats=args.stats.summary())
+    return 0
+
+def cmd_video_meta(args):
+    from mp4_metadata_editor import get_video_metadata, probe_video, generate_output_path, load_probe_cache, save_probe_cache, PROBE_CONCURRENCY
+
+    files = collect_files(args.paths, args.glob or VIDEO_PATTERNS, args.recursive, args.include_outputs)
+    new_metadata = _parse_metadata(args.set)
+    cache = None if args.no_cache or args.show else OutputCache(args.cache)
+    if args.probe_cache:
+        load_probe_cache(args.probe_cache)
+
+    def run(file_path):
+        if args.show:
+            metadata = get_video_metadata(file_path, native=True) if args.native else probe_video(file_path)
+            return {"file": file_path, "metadata": metadata, "error": metadata.get("error")}
+        return _update_video(file_path, new_metadata, generate_output_path(file_path, args.suffix), args, cache)
+
+    emit("start", command="video-meta", total=len(files))
+    failed = 0
+    jobs = args.jobs or (PROBE_CONCURRENCY if args.show else 1)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(run, files):
+            if result["error"]:
+                failed += 1
+            emit("result", **result)
+    if args.probe_cache:
+        save_probe_cache(args.probe_cache)
+    emit("done", total=len(files), ok=len(files) - failed, failed=failed, stats=args.stats.summary())
+    return 1 if failed else 0
+
+def cmd_catalog(args):
+    from metadata_catalog import DEFAULT_CATALOG_PATH, INDEX_CONCURRENCY, MetadataCatalog
+
+    catalog = MetadataCatalog(args.catalog or DEFAULT_CATALOG_PATH)
+    try:
+        if args.paths:
+            files = collect_files(args.paths, args.glob or IMAGE_PATTERNS + VIDEO_PATTERNS, args.recursive, args.include_outputs)
+            emit("start", command="catalog", total=len(files))
+            summary = catalog.index_files(files, workers=args.jobs or INDEX_CONCURRENCY, force=args.reindex)
+            emit("indexed", **summary)
+        if args.prune:
+            emit("pruned", removed=catalog.prune())
+        queries = []
+        if args.missing:
+            queries.append(("missing", args.missing, lambda: catalog.missing_tag(args.missing, args.kind)))
+        if args.differs:
+            name, sep, value = args.differs.partition("=")
+            if not sep:
+                raise SystemExit(f"Consulta inválida (use chave=valor): {args.differs}")
+            queries.append(("differs", args.differs, lambda: catalog.tag_differs(name, value, args.kind)))
+        if args.search:
+            queries.append(("search", args.search, lambda: catalog.search(args.search, args.kind, args.limit)))
+        total = 0
+        for query, value, run in queries:
+            try:
+                matches = run()
+            except sqlite3.OperationalError as e:
+                emit("error", query=query, value=value, error=str(e))
+                return 1
+            for path in matches:
+                emit("match", query=query, value=value, file=path)
+            total += len(matches)
+        emit("done", matches=total, stats=args.stats.summary())
+        return 0
+    finally:
+        catalog.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="florianistudio", description="Processamento em lote sem interface gráfica.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_input_args(sub):
+        sub.add_argument("paths", nargs="+", help="Arquivos ou pastas de entrada")
+        sub.add_argument("-r", "--recursive", action="store_true", help="Percorre subpastas")
+        sub.add_argument("-g", "--glob", action="append", help="Filtro de nome (pode repetir), ex.: '*.jpg'")
+        sub.add_argument("-j", "--jobs", type=int, default=None, help="Número de processos paralelos")
+        sub.add_argument("--cache", default=DEFAULT_CACHE_PATH, metavar="ARQUIVO", help="Índice SQLite de saídas já geradas")
+        sub.add_argument("--no-cache", action="store_true", help="Reprocessa tudo, ignorando o índice de saídas")
+        sub.add_argument("--include-outputs", action="store_true", help="Não ignora arquivos já gerados (_watermarked, _Mfix, ...)")
+        sub.add_argument("--metrics-jsonl", default=None, metavar="ARQUIVO", help="Grava eventos de métricas por etapa (JSON por linha)")
+        sub.add_argument("--metrics-prom", default=None, metavar="ARQUIVO", help="Exporta métricas no formato textfile do Prometheus")
+
+    watermark = subparsers.add_parser("watermark", help="Aplica marca d'água e metadados EXIF em imagens")
+    add_input_args(watermark)
+    watermark.add_argument("--logo", default=DEFAULT_LOGO, help="Imagem da marca d'água")
+    watermark.add_argument("--no-watermark", action="store_true", help="Apenas grava os metadados EXIF")
+    watermark.add_argument("--no-exif", action="store_true", help="Apenas aplica a marca d'água")
+    watermark.add_argument("--profile", choices=["default", "web-fast", "web", "archive", "keep-source-quality"], default=None, help="Perfil de codificação (ajustes próprios de cada formato)")
+    watermark.add_argument("--format", choices=["auto", "jpeg", "png", "webp", "avif"], default=None, help="Formato de saída (padrão: o mesmo da entrada)")
+    watermark.add_argument("--rendition", action="append", metavar="NOME[=PX]", help="Versão a gerar (full, web, thumb ou nome=lado maior em px); pode repetir")
+    watermark.add_argument("--backend", choices=["auto", "pillow", "numpy", "strips"], default=None, help="Implementação da composição da marca d'água")
+    watermark.add_argument("--memory-budget", type=float, default=None, metavar="MB", help="Memória por processo; acima disso a marca d'água é aplicada em faixas")
+    watermark.add_argument("--batch-memory", type=float, default=None, metavar="MB", help="Memória total estimada para os arquivos em processamento simultâneo")
+    watermark.set_defaults(func=cmd_watermark)
+
+    video = subparsers.add_parser("video-meta", help="Lê ou altera metadados de vídeos MP4")
+    add_input_args(video)
+    video.add_argument("--show", action="store_true", help="Apenas mostra os metadados (ffprobe)")
+    video.add_argument("--set", action="append", metavar="CHAVE=VALOR", help="Metadado a gravar (pode repetir)")
+    video.add_argument("--vf", default=None, help="Filtros de vídeo do FFmpeg")
+    video.add_argument("--af", default=None, help="Filtros de áudio do FFmpeg")
+    video.add_argument("--preset", default=None, help="Preset do encoder x264/x265 para os fluxos re-encodificados (padrão: medium)")
+    video.add_argument("--crf", type=int, default=None, help="CRF dos fluxos de vídeo re-encodificados (padrão: mantém o bitrate original)")
+    video.add_argument("--dry-run", action="store_true", help="Mostra o plano por fluxo e o custo estimado sem executar o FFmpeg")
+    video.add_argument("--watermark", nargs="?", const=DEFAULT_LOGO, default=None, metavar="LOGO", help="Aplica a marca d'água em mosaico no mesmo passe do FFmpeg (padrão: logo render.png)")
+    video.add_argument("--suffix", default="_edited", help="Sufixo do arquivo de saída")
+    video.add_argument("--native", action="store_true", help="Lê as tags direto dos átomos MP4, sem ffprobe (com --show)")
+    video.add_argument("--ffmpeg", action="store_true", help="Sempre grava via remux do FFmpeg, sem edição direta dos átomos")
+    video.add_argument("--probe-cache", default=None, metavar="ARQUIVO", help="Cache persistente dos resultados do ffprobe (JSON)")
+    video.set_defaults(func=cmd_video_meta)
+
+    watch = subparsers.add_parser("watch", help="Observa uma pasta e processa imagens e vídeos assim que terminam de ser gravados")
+    watch.add_argument("folder", help="Pasta de entrada a observar")
+    watch.add_argument("-o", "--output-dir", required=True, help="Pasta onde os arquivos processados são gravados")
+    watch.add_argument("-r", "--recursive", action="store_true", help="Observa também as subpastas")
+    watch.add_argument("-g", "--glob", action="append", help="Filtro de nome (pode repetir), ex.: '*.jpg'")
+    watch.add_argument("-j", "--jobs", type=int, default=None, help="Arquivos processados em paralelo")
+    watch.add_argument("--cache", default=DEFAULT_CACHE_PATH, metavar="ARQUIVO", help="Índice SQLite de saídas já geradas")
+    watch.add_argument("--no-cache", action="store_true", help="Reprocessa tudo, ignorando o índice de saídas")
+    watch.add_argument("--logo", default=DEFAULT_LOGO, help="Imagem da marca d'água")
+    watch.add_argument("--no-watermark", action="store_true", help="Apenas grava os metadados EXIF")
+    watch.add_argument("--no-exif", action="store_true", help="Apenas aplica a marca d'água")
+    watch.add_argument("--profile", choices=["default", "web-fast", "web", "archive", "keep-source-quality"], default=None, help="Perfil de codificação (ajustes próprios de cada formato)")
+    watch.add_argument("--format", choices=["auto", "jpeg", "png", "webp", "avif"], default=None, help="Formato de saída das imagens (padrão: o mesmo da entrada)")
+    watch.add_argument("--memory-budget", type=float, default=None, metavar="MB", help="Memória por arquivo; acima disso a marca d'água é aplicada em faixas")
+    watch.add_argument("--set", action="append", metavar="CHAVE=VALOR", help="Metadado a gravar nos vídeos (pode repetir)")
+    watch.add_argument("--suffix", default="_edited", help="Sufixo dos vídeos de saída")
+    watch.add_argument("--stable-seconds", type=float, default=2.0, help="Tempo sem alterações para considerar o arquivo completo")
+    watch.add_argument("--poll-interval", type=float, default=1.0, help="Intervalo de verificação em segundos")
+    watch.add_argument("--queue-size", type=int, default=32, help="Máximo de arquivos prontos aguardando processamento")
+    watch.add_argument("--poll", action="store_true", help="Usa varredura periódica em vez de eventos do sistema de arquivos")
+    watch.add_argument("--metrics-jsonl", default=None, metavar="ARQUIVO", help="Grava eventos de métricas por etapa (JSON por linha)")
+    watch.add_argument("--metrics-prom", default=None, metavar="ARQUIVO", help="Exporta métricas no formato textfile do Prometheus")
+    watch.set_defaults(func=cmd_watch, vf=None, af=None, ffmpeg=False, preset=None, crf=None, dry_run=False, watermark=None)
+
+    catalog = subparsers.add_parser("catalog", help="Indexa metadados de imagens e vídeos num catálogo SQLite e faz consultas")
+    catalog.add_argument("paths", nargs="*", help="Arquivos ou pastas a indexar (apenas os alterados são relidos)")
+    catalog.add_argument("-r", "--recursive", action="store_true", help="Percorre subpastas")
+    catalog.add_argument("-g", "--glob", action="append", help="Filtro de nome (pode repetir), ex.: '*.jpg'")
+    catalog.add_argument("-j", "--jobs", type=int, default=None, help="Arquivos lidos em paralelo")
+    catalog.add_argument("--include-outputs", action="store_true", help="Indexa também os arquivos gerados (_watermarked, _Mfix, ...)")
+    catalog.add_argument("--catalog", default=None, metavar="ARQUIVO", help="Banco SQLite do catálogo")
+    catalog.add_argument("--reindex", action="store_true", help="Relê todos os arquivos, mesmo os inalterados")
+    catalog.add_argument("--prune", action="store_true", help="Remove do catálogo os arquivos que não existem mais")
+    catalog.add_argument("--kind", choices=["image", "video"], default=None, help="Restringe as consultas a imagens ou vídeos")
+    catalog.add_argument("--missing", default=None, metavar="TAG", help="Lista os arquivos sem a tag (ex.: Artist)")
+    catalog.add_argument("--differs", default=None, metavar="TAG=VALOR", help="Lista os arquivos em que a tag falta ou tem outro valor")
+    catalog.add_argument("--search", default=None, metavar="TEXTO", help="Busca de texto completo (sintaxe FTS5) nas tags")
+    catalog.add_argument("--limit", type=int, default=1000, help="Máximo de resultados da busca de texto")
+    catalog.add_argument("--metrics-jsonl", default=None, metavar="ARQUIVO", help="Grava eventos de métricas por etapa (JSON por linha)")
+    catalog.add_argument("--metrics-prom", default=None, metavar="ARQUIVO", help="Exporta métricas no formato textfile do Prometheus")
+    catalog.set_defaults(func=cmd_catalog)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("watermark", "watch") and args.no_watermark and args.no_exif:
+        build_parser().error("--no-watermark e --no-exif não podem ser usados juntos")
+    configure_from_env()
+    sinks = [metrics.add_sink(MemorySink())]
+    args.stats = sinks[0]
+    if args.metrics_jsonl:
+        sinks.append(metrics.add_sink(JsonLinesSink(args.metrics_jsonl)))
+    if args.metrics_prom:
+        sinks.append(metrics.add_sink(PrometheusTextfileSink(args.metrics_prom)))
+    try:
+        return args.func(args)
+    finally:
+        for sink in sinks:
+            metrics.remove_sink(sink)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import piexif
+from PIL import Image
+
+from metrics import metrics
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".florianistudio", "catalog.sqlite3")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff")
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov")
+INDEX_BATCH_SIZE = 500
+INDEX_CONCURRENCY = 4
+MAX_VALUE_LENGTH = 1024
+SKIPPED_EXIF_TAGS = {piexif.ExifIFD.MakerNote, piexif.ImageIFD.ExifTag, piexif.ImageIFD.GPSTag, piexif.ExifIFD.InteroperabilityTag}
+XP_TAGS = {piexif.ImageIFD.XPTitle, piexif.ImageIFD.XPComment, piexif.ImageIFD.XPAuthor, piexif.ImageIFD.XPKeywords, piexif.ImageIFD.XPSubject}
+USER_COMMENT_PREFIXES = {b"ASCII\x00\x00\x00": "ascii", b"UNICODE\x00": "utf-16", b"JIS\x00\x00\x00\x00\x00": "shift_jis", b"\x00" * 8: "utf-8"}
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS files ("
+    "path TEXT PRIMARY KEY, kind TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+    "indexed_at REAL NOT NULL, metadata TEXT, error TEXT)",
+    "CREATE INDEX IF NOT EXISTS files_kind ON files (kind)",
+    "CREATE TABLE IF NOT EXISTS tags ("
+    "id INTEGER PRIMARY KEY, path TEXT NOT NULL, scope TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS tags_path ON tags (path, name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS tags_name ON tags (name COLLATE NOCASE, value)",
+    # One full-text document per file (rowid = files.rowid): far cheaper to
+    # maintain than one FTS row per tag, and re-indexing deletes by rowid.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(text)",
+]
+
+def file_kind(file_path):
+    lower = file_path.lower()
+    if lower.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    if lower.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return None
+
+def exif_text(ifd, tag, value):
+    if ifd == "0th" and tag in XP_TAGS and isinstance(value, tuple):
+        value = bytes(value)
+    if isinstance(value, bytes):
+        if value[:2] in (b"\xff\xfe", b"\xfe\xff"):
+            text = value.decode("utf-16", errors="replace")
+        elif ifd == "0th" and tag in XP_TAGS:
+            text = value.decode("utf-16-le", errors="replace")
+        elif ifd == "Exif" and tag == piexif.ExifIFD.UserComment and value[:8] in USER_COMMENT_PREFIXES:
+            text = value[8:].decode(USER_COMMENT_PREFIXES[value[:8]], errors="replace")
+        else:
+            text = value.decode("utf-8", errors="replace")
+        text = text.strip("\x00").strip()
+    elif isinstance(value, tuple) and len(value) == 2 and all(isinstance(part, int) for part in value):
+        text = f"{value[0]}/{value[1]}"
+    else:
+        text = str(value)
+    return text[:MAX_VALUE_LENGTH]
+
+def exif_metadata(exif_dict):
+    # piexif's {ifd: {tag id: raw value}} to the catalog's {ifd: {tag name: text}}.
+    metadata = {}
+    for ifd, tags in exif_dict.items():
+        if not isinstance(tags, dict):
+            continue
+        for tag, value in tags.items():
+            if tag in SKIPPED_EXIF_TAGS or tag not in piexif.TAGS[ifd]:
+                continue
+            metadata.setdefault(ifd, {})[piexif.TAGS[ifd][tag]["name"]] = exif_text(ifd, tag, value)
+    return metadata
+
+def read_image_metadata(file_path):
+    # Image.open only parses the header, so the pixel data is never decoded.
+    with Image.open(file_path) as img:
+        exif_data = img.info.get("exif")
+    return exif_metadata(piexif.load(exif_data) if exif_data else {})
+
+def read_video_metadata(file_path):
+    from mp4_metadata_editor import probe_with_fallback
+
+    metadata = probe_with_fallback(file_path)
+    if not metadata:
+        raise ValueError("Não foi possível ler os metadados do vídeo.")
+    return metadata
+
+def read_metadata(file_path, kind=None):
+    kind = kind or file_kind(file_path)
+    if kind == "image":
+        return read_image_metadata(file_path)
+    if kind == "video":
+        return read_video_metadata(file_path)
+    raise ValueError(f"Tipo de arquivo não suportado: {file_path}")
+
+def metadata_tags(kind, metadata):
+    if kind == "image":
+        return [(ifd, name, value) for ifd, tags in metadata.items() for name, value in tags.items()]
+    tags = [("format", name, str(value)) for name, value in metadata.get("format", {}).get("tags", {}).items()]
+    for index, stream in enumerate(metadata.get("streams", [])):
+        scope = f"stream:{stream.get('index', index)}:{stream.get('codec_type', '')}"
+        tags.extend((scope, name, str(value)) for name, value in stream.get("tags", {}).items())
+    return tags
+
+class MetadataCatalog:
+    def __init__(self, catalog_path=DEFAULT_CATALOG_PATH):
+        if catalog_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(catalog_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(catalog_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def _signatures(self, paths):
+        signatures = {}
+        with self._lock:
+            for start in range(0, len(paths), INDEX_BATCH_SIZE):
+                chunk = paths[start:start + INDEX_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns FROM files WHERE path IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                signatures.update((path, (size, mtime_ns)) for path, size, mtime_ns in rows)
+        return signatures
+
+    def stale(self, file_paths):
+        paths = [os.path.abspath(file_path) for file_path in file_paths]
+        signatures = self._signatures(paths)
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if signatures.get(path) != (stat.st_size, stat.st_mtime_ns):
+                stale.append(path)
+        return stale
+
+    def store_many(self, entries):
+        # entries: (file_path, kind, metadata, error); written in a single
+        # transaction, which is what keeps bulk indexing fast.
+        rows = []
+        for file_path, kind, metadata, error in entries:
+            path = os.path.abspath(file_path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            rows.append((path, kind, stat, metadata, error))
+        if not rows:
+            return 0
+        now = time.time()
+        with self._lock, self._conn:
+            for path, kind, stat, metadata, error in rows:
+                self._delete(path)
+                cursor = self._conn.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, kind, stat.st_size, stat.st_mtime_ns, now, None if error else json.dumps(metadata, ensure_ascii=False, default=str), error)
+                )
+                if error:
+                    continue
+                tags = metadata_tags(kind, metadata)
+                self._conn.executemany("INSERT INTO tags (path, scope, name, value) VALUES (?, ?, ?, ?)", [(path, *tag) for tag in tags])
+                self._conn.execute(
+                    "INSERT INTO files_fts (rowid, text) VALUES (?, ?)",
+                    (cursor.lastrowid, "\n".join(f"{name} {value}" for _, name, value in tags))
+                )
+        return len(rows)
+
+    def _delete(self, path):
+        row = self._conn.execute("SELECT rowid FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM files_fts WHERE rowid = ?", row)
+        self._conn.execute("DELETE FROM tags WHERE path = ?", (path,))
+        self._conn.execute("DELETE FROM files WHERE rowid = ?", row)
+
+    def index_files(self, file_paths, workers=INDEX_CONCURRENCY, batch_size=INDEX_BATCH_SIZE, force=False, cancel_event=None):
+        file_paths = [file_path for file_path in file_paths if file_kind(file_path)]
+        pending = [os.path.abspath(file_path) for file_path in file_paths] if force else self.stale(file_paths)
+        summary = {"total": len(file_paths), "indexed": 0, "skipped": len(file_paths) - len(pending), "errors": 0}
+
+        def read(path):
+            kind = file_kind(path)
+            try:
+                return path, kind, read_metadata(path, kind), None
+            except Exception as e:
+                return path, kind, None, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="catalog") as executor:
+            for start in range(0, len(pending), batch_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                with metrics.stage("catalog_index", items=min(batch_size, len(pending) - start)):
+                    entries = list(executor.map(read, pending[start:start + batch_size]))
+                    self.store_many(entries)
+                summary["indexed"] += len(entries)
+                summary["errors"] += sum(1 for entry in entries if entry[3])
+        metrics.count("catalog_files", summary["indexed"], result="indexed")
+        metrics.count("catalog_files", summary["skipped"], result="skipped")
+        return summary
+
+    def get(self, file_path, refresh=True):
+        # Returns the stored metadata while the file is unchanged; with
+        # refresh, a stale or missing entry is re-read and stored first.
+        path = os.path.abspath(file_path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, metadata, error FROM files WHERE path = ?", (path,)).fetchone()
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return {"error": str(e)}
+        if row is not None and (row[0], row[1]) == (stat.st_size, stat.st_mtime_ns):
+            metrics.count("catalog_lookup", result="hit")
+            return {"error": row[3]} if row[3] else json.loads(row[2])
+        metrics.count("catalog_lookup", result="miss")
+        if not refresh:
+            return None
+        kind = file_kind(path)
+        try:
+            metadata = read_metadata(path, kind)
+        except Exception as e:
+            return {"error": str(e)}
+        self.store_many([(path, kind, metadata, None)])
+        return metadata
+
+    def _paths(self, query, params):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def missing_tag(self, name, kind=None):
+        return self._paths(
+            "SELECT path FROM files f WHERE error IS NULL AND (? IS NULL OR kind = ?) AND NOT EXISTS ("
+            "SELECT 1 FROM tags t WHERE t.path = f.path AND t.name = ? COLLATE NOCASE AND t.value != '') ORDER BY path",
+            (kind, kind, name)
+        )
+
+    def tag_differs(self, name, value, kind=None):
+        # Files where any `name` tag (e.g. a stream's handler_name) has another
+        # value, or where the tag is absent altogether.
+        return self._paths(
+            "SELECT path FROM files f WHERE error IS NULL AND (? IS NULL OR kind = ?) AND ("
+            "EXISTS (SELECT 1 FROM tags t WHERE t.path = f.path AND t.name = ? COLLATE NOCASE AND t.value != ?) OR "
+            "NOT EXISTS (SELECT 1 FROM tags t WHERE t.path = f.path AND t.name = ? COLLATE NOCASE)) ORDER BY path",
+            (kind, kind, name, value, name)
+        )
+
+    def search(self, text, kind=None, limit=1000):
+        return self._paths(
+            "SELECT path FROM files WHERE rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?) "
+            "AND (? IS NULL OR kind = ?) ORDER BY path LIMIT ?",
+            (text, kind, kind, limit)
+        )
+
+    def prune(self):
+        paths = self._paths("SELECT path FROM files", ())
+        missing = [path for path in paths if not os.path.exists(path)]
+        with self._lock, self._conn:
+            for path in missing:
+                self._delete(path)
+        return len(missing)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("florianistudio")
+
+LOG_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+class LoggingSink:
+    def write(self, record):
+        kind = record["type"]
+        if kind == "log":
+            logger.log(LOG_LEVELS.get(record.get("level"), logging.INFO), record["message"])
+        elif kind == "error":
+            logger.error("[%s] %s: %s", record["stage"], record.get("file") or "-", record["message"])
+        elif kind == "stage":
+            logger.debug("[%s] %s %.3fs", record["stage"], record.get("file") or "-", record["seconds"])
+
+    def close(self):
+        pass
+
+class JsonLinesSink:
+    def __init__(self, target):
+        if isinstance(target, str):
+            self._stream = open(target, "a", encoding="utf-8")
+            self._owns_stream = True
+        else:
+            self._stream = target
+            self._owns_stream = False
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def close(self):
+        if self._owns_stream:
+            self._stream.close()
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+class MemorySink:
+    def __init__(self, max_errors=1000):
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.errors = deque(maxlen=max_errors)
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        kind = record["type"]
+        with self._lock:
+            if kind == "stage":
+                stats = self.stages.setdefault(record["stage"], {
+                    "count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes_in": 0, "bytes_out": 0,
+                })
+                stats["count"] += 1
+                stats["errors"] += 0 if record["ok"] else 1
+                stats["seconds"] += record["seconds"]
+                stats["max_seconds"] = max(stats["max_seconds"], record["seconds"])
+                stats["bytes_in"] += record.get("bytes_in", 0)
+                stats["bytes_out"] += record.get("bytes_out", 0)
+            elif kind == "counter":
+                key = (record["name"], _labels_key(record["labels"]))
+                self.counters[key] = self.counters.get(key, 0) + record["value"]
+            elif kind == "gauge":
+                self.gauges[(record["name"], _labels_key(record["labels"]))] = record["value"]
+            elif kind == "error":
+                self.errors.append(record)
+
+    def summary(self):
+        with self._lock:
+            stages = {}
+            for stage, stats in self.stages.items():
+                stages[stage] = {
+                    **stats,
+                    "seconds": round(stats["seconds"], 4),
+                    "max_seconds": round(stats["max_seconds"], 4),
+                    "mean_seconds": round(stats["seconds"] / stats["count"], 4),
+                }
+            return {
+                "stages": stages,
+                "counters": {_format_key(key): value for key, value in self.counters.items()},
+                "gauges": {_format_key(key): value for key, value in self.gauges.items()},
+                "errors": len(self.errors),
+            }
+
+    def close(self):
+        pass
+
+def _format_key(key):
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + "}"
+
+class PrometheusTextfileSink(MemorySink):
+    # Meant for node_exporter's textfile collector: the file is rewritten
+    # atomically at most every `interval` seconds and on close.
+    def __init__(self, path, prefix="florianistudio", interval=10.0):
+        super().__init__()
+        self.path = path
+        self.prefix = prefix
+        self.interval = interval
+        self._last_flush = 0.0
+
+    def write(self, record):
+        super().write(record)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def render(self):
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            stage_metrics = [
+                ("stage_runs_total", "counter", "count"),
+                ("stage_errors_total", "counter", "errors"),
+                ("stage_seconds_total", "counter", "seconds"),
+                ("stage_bytes_in_total", "counter", "bytes_in"),
+                ("stage_bytes_out_total", "counter", "bytes_out"),
+            ]
+            for metric, metric_type, field in stage_metrics:
+                lines.append(f"# TYPE {prefix}_{metric} {metric_type}")
+                for stage, stats in sorted(self.stages.items()):
+                    lines.append(f"{prefix}_{metric}{_prometheus_labels((('stage', stage),))} {stats[field]}")
+            for values, metric_type, suffix in ((self.counters, "counter", "_total"), (self.gauges, "gauge", "")):
+                declared = set()
+                for (name, labels), value in sorted(values.items()):
+                    metric = f"{prefix}_{name}{suffix}"
+                    if metric not in declared:
+                        lines.append(f"# TYPE {metric} {metric_type}")
+                        declared.add(metric)
+                    lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.flush()
+
+class Metrics:
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self._local = threading.local()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+        sink.close()
+
+    def emit(self, record):
+        captured = getattr(self._local, "captured", None)
+        if captured is not None:
+            captured.append(record)
+            return
+        for sink in list(self.sinks):
+            try:
+                sink.write(record)
+            except Exception as e:
+                logger.warning("Falha ao gravar métrica em %s: %s", type(sink).__name__, e)
+
+    def _record(self, kind, **fields):
+        self.emit({"type": kind, "time": round(time.time(), 3), "pid": os.getpid(), **fields})
+
+    @contextmanager
+    def stage(self, stage, file=None, **fields):
+        info = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield info
+        except Exception as e:
+            self._record("stage", stage=stage, file=file, seconds=round(time.perf_counter() - start, 6), **{**info, "ok": False})
+            # Nested stages all see the same exception; report it only once,
+            # against the innermost stage.
+            if not getattr(e, "_metrics_reported", False):
+                self.error(stage, str(e), file)
+                e._metrics_reported = True
+            raise
+        # Callers may set info["ok"] = False for failures reported by return value.
+        self._record("stage", stage=stage, file=file, seconds=round(time.perf_counter() - start, 6), **{"ok": True, **info})
+
+    def count(self, name, value=1, **labels):
+        self._record("counter", name=name, value=value, labels=labels)
+
+    def gauge(self, name, value, **labels):
+        self._record("gauge", name=name, value=value, labels=labels)
+
+    def error(self, stage, message, file=None):
+        self._record("error", stage=stage, file=file, message=message)
+
+    def log(self, message, level="info", **fields):
+        self._record("log", level=level, message=message, **fields)
+
+    @contextmanager
+    def capture(self):
+        # Buffers this thread's records instead of sending them to the sinks,
+        # so worker processes can ship them back to the parent for replay().
+        previous = getattr(self._local, "captured", None)
+        records = []
+        self._local.captured = records
+        try:
+            yield records
+        finally:
+            self._local.captured = previous
+
+    def replay(self, records):
+        for record in records:
+            self.emit(record)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+metrics = Metrics([LoggingSink()])
+
+def configure_from_env(environ=None):
+    # GUI entry points have no flags; production batches opt in through
+    # FLORIANISTUDIO_METRICS_JSONL / FLORIANISTUDIO_METRICS_PROM.
+    environ = os.environ if environ is None else environ
+    logging.basicConfig(level=environ.get("FLORIANISTUDIO_LOG_LEVEL", "INFO").upper(), format="%(message)s")
+    if environ.get("FLORIANISTUDIO_METRICS_JSONL"):
+        metrics.add_sink(JsonLinesSink(environ["FLORIANISTUDIO_METRICS_JSONL"]))
+    if environ.get("FLORIANISTUDIO_METRICS_PROM"):
+        metrics.add_sink(PrometheusTextfileSink(environ["FLORIANISTUDIO_METRICS_PROM"]))
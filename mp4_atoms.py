@@ -0,0 +1,450 @@
+import os
+import shutil
+import struct
+from datetime import datetime, timedelta, timezone
+
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"meta", b"ilst", b"edts", b"dinf", b"mvex"}
+FREE_BOXES = {b"free", b"skip"}
+PADDING_SIZE = 4096
+COPY_CHUNK_SIZE = 1024 * 1024
+
+TAG_TO_ATOM = {
+    "title": b"\xa9nam",
+    "artist": b"\xa9ART",
+    "album_artist": b"aART",
+    "album": b"\xa9alb",
+    "composer": b"\xa9wrt",
+    "genre": b"\xa9gen",
+    "comment": b"\xa9cmt",
+    "date": b"\xa9day",
+    "encoder": b"\xa9too",
+    "copyright": b"cprt",
+    "grouping": b"\xa9grp",
+    "lyrics": b"\xa9lyr",
+    "description": b"desc",
+    "synopsis": b"ldes",
+    "show": b"tvsh",
+    "episode_id": b"tven",
+    "network": b"tvnt",
+    "keywords": b"keyw",
+}
+ATOM_TO_TAG = {atom: tag for tag, atom in TAG_TO_ATOM.items()}
+# Integer items as ffmpeg's mov muxer writes them: trkn/disk hold a
+# number/total pair, the rest a big-endian integer of the given size.
+PAIR_TAGS = {"track": b"trkn", "disc": b"disk"}
+INTEGER_TAGS = {
+    "media_type": (b"stik", 1),
+    "hd_video": (b"hdvd", 1),
+    "gapless_playback": (b"pgap", 1),
+    "compilation": (b"cpil", 1),
+    "season_number": (b"tvsn", 4),
+    "episode_sort": (b"tves", 4),
+}
+ATOM_TO_PAIR_TAG = {atom: tag for tag, atom in PAIR_TAGS.items()}
+ATOM_TO_INTEGER_TAG = {atom: tag for tag, (atom, _) in INTEGER_TAGS.items()}
+# Keys ffprobe reports from ftyp/mvhd; they can't be changed by editing ilst.
+STRUCTURAL_TAGS = {"major_brand", "minor_version", "compatible_brands", "creation_time"}
+HANDLER_TYPES = {b"vide": "video", b"soun": "audio", b"subt": "subtitle", b"text": "subtitle", b"sbtl": "subtitle"}
+ITUNES_HDLR = b"\x00" * 8 + b"mdirappl" + b"\x00" * 9
+MP4_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+SAMPLE_ENTRY_CODECS = {
+    b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc", b"av01": "av1", b"vp09": "vp9",
+    b"mp4v": "mpeg4", b"mp4a": "aac", b"ac-3": "ac3", b"ec-3": "eac3", b"Opus": "opus", b"fLaC": "flac",
+}
+
+class Box:
+    def __init__(self, box_type, data=b"", children=None, prefix=b"", tail=b""):
+        self.type = box_type
+        self.data = data
+        self.children = children
+        self.prefix = prefix
+        self.tail = tail
+
+    def find(self, *path):
+        box = self
+        for box_type in path:
+            box = next((child for child in box.children or [] if child.type == box_type), None)
+            if box is None:
+                return None
+        return box
+
+    def find_all(self, box_type):
+        for child in self.children or []:
+            if child.type == box_type:
+                yield child
+            yield from child.find_all(box_type)
+
+def iter_boxes(f, start, end):
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError(f"Caixa MP4 inválida em {offset}.")
+        yield box_type, offset, size, header_size
+        offset += size
+
+def parse_boxes(data, parent_type=None):
+    boxes = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise ValueError(f"Caixa MP4 inválida dentro de {parent_type!r}.")
+        boxes.append(_make_box(box_type, data[offset + header_size:offset + size], parent_type))
+        offset += size
+    return boxes, data[offset:]
+
+def _make_box(box_type, payload, parent_type):
+    if box_type not in CONTAINER_BOXES and parent_type != b"ilst":
+        return Box(box_type, payload)
+    prefix = b""
+    if box_type == b"meta" and payload[4:8] != b"hdlr":
+        # ISO meta is a full box; QuickTime meta starts directly with hdlr.
+        prefix, payload = payload[:4], payload[4:]
+    children, tail = parse_boxes(payload, box_type)
+    return Box(box_type, children=children, prefix=prefix, tail=tail)
+
+def serialize_box(box):
+    if box.children is not None:
+        body = box.prefix + b"".join(serialize_box(child) for child in box.children) + box.tail
+    else:
+        body = box.data
+    size = len(body) + 8
+    if size > 0xFFFFFFFF:
+        return struct.pack(">I4sQ", 1, box.type, size + 8) + body
+    return struct.pack(">I4s", size, box.type) + body
+
+def free_box(size):
+    return struct.pack(">I4s", size, b"free") + b"\x00" * (size - 8)
+
+def read_moov(file_path):
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        top_level = list(iter_boxes(f, 0, file_size))
+        moov_entry = next((entry for entry in top_level if entry[0] == b"moov"), None)
+        if moov_entry is None:
+            raise ValueError("Átomo moov não encontrado.")
+        _, offset, size, header_size = moov_entry
+        f.seek(offset + header_size)
+        moov = _make_box(b"moov", f.read(size - header_size), None)
+        ftyp = None
+        ftyp_entry = next((entry for entry in top_level if entry[0] == b"ftyp"), None)
+        if ftyp_entry:
+            f.seek(ftyp_entry[1] + ftyp_entry[3])
+            ftyp = f.read(ftyp_entry[2] - ftyp_entry[3])
+    return moov, ftyp, top_level, file_size
+
+def _ilst(moov, create=False):
+    meta = moov.find(b"udta", b"meta") or moov.find(b"meta")
+    if meta is None:
+        if not create:
+            return None
+        udta = moov.find(b"udta")
+        if udta is None:
+            udta = Box(b"udta", children=[])
+            moov.children.append(udta)
+        meta = Box(b"meta", children=[Box(b"hdlr", ITUNES_HDLR)], prefix=b"\x00" * 4)
+        udta.children.append(meta)
+    if meta.find(b"keys") is not None:
+        raise ValueError("Metadados no formato mdta/keys não são suportados.")
+    ilst = meta.find(b"ilst")
+    if ilst is None and create:
+        ilst = Box(b"ilst", children=[])
+        meta.children.append(ilst)
+    return ilst
+
+def _read_text_item(item):
+    data = item.find(b"data")
+    if data is None or len(data.data) < 8:
+        return None
+    type_indicator = struct.unpack(">I", data.data[:4])[0] & 0xFFFFFF
+    value = data.data[8:]
+    if type_indicator == 1:
+        return value.decode("utf-8", errors="replace")
+    if type_indicator == 2:
+        return value.decode("utf-16-be", errors="replace")
+    if type_indicator == 21 and len(value) in (1, 2, 4, 8):
+        return str(int.from_bytes(value, "big", signed=True))
+    return None
+
+def _read_pair_item(item):
+    data = item.find(b"data")
+    if data is None or len(data.data) < 14:
+        return None
+    number, total = struct.unpack(">HH", data.data[10:14])
+    return f"{number}/{total}" if total else str(number)
+
+def _is_pascal(name):
+    return len(name) > 1 and name[0] == len(name) - 1 and name[-1] != 0
+
+def _handler(trak):
+    hdlr = trak.find(b"mdia", b"hdlr")
+    if hdlr is None or len(hdlr.data) < 24:
+        return None, None
+    name = hdlr.data[24:]
+    if _is_pascal(name):
+        name = name[1:]
+    return hdlr.data[8:12], name.split(b"\x00", 1)[0].decode("utf-8", errors="replace")
+
+def _language(trak):
+    mdhd = trak.find(b"mdia", b"mdhd")
+    if mdhd is None or not mdhd.data:
+        return None
+    offset = 28 if mdhd.data[0] == 1 else 20
+    if len(mdhd.data) < offset + 2:
+        return None
+    packed = struct.unpack_from(">H", mdhd.data, offset)[0]
+    return "".join(chr(((packed >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))
+
+def _movie_header(moov):
+    mvhd = moov.find(b"mvhd")
+    if mvhd is None or not mvhd.data:
+        return None, None
+    if mvhd.data[0] == 1:
+        creation, _, timescale, duration = struct.unpack_from(">QQIQ", mvhd.data, 4)
+    else:
+        creation, _, timescale, duration = struct.unpack_from(">IIII", mvhd.data, 4)
+    creation_time = None
+    if creation:
+        creation_time = (MP4_EPOCH + timedelta(seconds=creation)).strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+    return creation_time, (duration / timescale if timescale else None)
+
+def _sample_entry(trak, codec_type):
+    stsd = trak.find(b"mdia", b"minf", b"stbl", b"stsd")
+    if stsd is None or len(stsd.data) < 16:
+        return {}
+    entry = stsd.data[8:]
+    fourcc = entry[4:8]
+    info = {"codec_name": SAMPLE_ENTRY_CODECS.get(fourcc, fourcc.decode("latin-1").strip()), "codec_tag_string": fourcc.decode("latin-1")}
+    if codec_type == "video" and len(entry) >= 36:
+        info["width"], info["height"] = struct.unpack_from(">HH", entry, 32)
+    elif codec_type == "audio" and len(entry) >= 36:
+        info["channels"] = struct.unpack_from(">H", entry, 24)[0]
+        info["sample_rate"] = str(struct.unpack_from(">I", entry, 32)[0] >> 16)
+    return info
+
+def _stream_bit_rate(trak):
+    mdhd = trak.find(b"mdia", b"mdhd")
+    stsz = trak.find(b"mdia", b"minf", b"stbl", b"stsz")
+    if mdhd is None or stsz is None or len(stsz.data) < 12:
+        return None
+    if mdhd.data[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", mdhd.data, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", mdhd.data, 12)
+    sample_size, sample_count = struct.unpack_from(">II", stsz.data, 4)
+    if sample_size:
+        total = sample_size * sample_count
+    else:
+        total = sum(struct.unpack_from(f">{sample_count}I", stsz.data, 12))
+    if not timescale or not duration:
+        return None
+    return str(int(total * 8 * timescale / duration))
+
+def read_mp4_metadata(file_path):
+    moov, ftyp, _, file_size = read_moov(file_path)
+    tags = {}
+    if ftyp and len(ftyp) >= 8:
+        tags["major_brand"] = ftyp[:4].decode("latin-1")
+        tags["minor_version"] = str(struct.unpack(">I", ftyp[4:8])[0])
+        tags["compatible_brands"] = b"".join(ftyp[i:i + 4] for i in range(8, len(ftyp) - 3, 4)).decode("latin-1")
+    creation_time, duration = _movie_header(moov)
+    if creation_time:
+        tags["creation_time"] = creation_time
+    ilst = _ilst(moov)
+    for item in (ilst.children if ilst else []):
+        if item.type in ATOM_TO_PAIR_TAG:
+            tag, value = ATOM_TO_PAIR_TAG[item.type], _read_pair_item(item)
+        else:
+            tag = ATOM_TO_TAG.get(item.type) or ATOM_TO_INTEGER_TAG.get(item.type)
+            value = _read_text_item(item) if tag else None
+        if value is not None:
+            tags[tag] = value
+    streams = []
+    for index, trak in enumerate(moov.find_all(b"trak")):
+        handler_type, handler_name = _handler(trak)
+        stream_tags = {}
+        language = _language(trak)
+        if language:
+            stream_tags["language"] = language
+        if handler_name is not None:
+            stream_tags["handler_name"] = handler_name
+        codec_type = HANDLER_TYPES.get(handler_type, "data")
+        stream = {"index": index, "codec_type": codec_type, **_sample_entry(trak, codec_type), "tags": stream_tags}
+        bit_rate = _stream_bit_rate(trak)
+        if bit_rate:
+            stream["bit_rate"] = bit_rate
+        streams.append(stream)
+    format_info = {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "nb_streams": len(streams), "size": str(file_size), "tags": tags}
+    if duration is not None:
+        format_info["duration"] = f"{duration:.6f}"
+    return {"format": format_info, "streams": streams}
+
+def _item_payload(tag, value):
+    if tag in PAIR_TAGS:
+        number, _, total = str(value).partition("/")
+        # Same layout as ffmpeg: reserved, number, total; disk has no trailer.
+        payload = struct.pack(">HHH", 0, int(number), int(total or 0))
+        return PAIR_TAGS[tag], struct.pack(">II", 0, 0) + payload + (b"\x00\x00" if tag == "track" else b"")
+    if tag in INTEGER_TAGS:
+        atom, size = INTEGER_TAGS[tag]
+        return atom, struct.pack(">II", 21, 0) + int(value).to_bytes(size, "big", signed=True)
+    return TAG_TO_ATOM[tag], struct.pack(">II", 1, 0) + str(value).encode("utf-8")
+
+def _set_tags(moov, tags):
+    ilst = _ilst(moov, create=True)
+    for tag, value in tags.items():
+        atom, payload = _item_payload(tag, value)
+        item = Box(atom, children=[Box(b"data", payload)])
+        for index, child in enumerate(ilst.children):
+            if child.type == atom:
+                ilst.children[index] = item
+                break
+        else:
+            ilst.children.append(item)
+
+def _set_handler_names(moov, handler_names):
+    pending = dict(handler_names)
+    for trak in moov.find_all(b"trak"):
+        handler_type, _ = _handler(trak)
+        codec_type = HANDLER_TYPES.get(handler_type)
+        if codec_type not in pending:
+            continue
+        hdlr = trak.find(b"mdia", b"hdlr")
+        old_name = hdlr.data[24:]
+        name = pending.pop(codec_type).encode("utf-8")
+        if _is_pascal(old_name):
+            name = bytes([min(len(name), 255)]) + name[:255]
+        else:
+            name += b"\x00"
+        hdlr.data = hdlr.data[:24] + name
+
+def shift_chunk_offsets(moov, threshold, delta):
+    for stco in moov.find_all(b"stco"):
+        count = struct.unpack_from(">I", stco.data, 4)[0]
+        offsets = [offset + delta if offset >= threshold else offset for offset in struct.unpack_from(f">{count}I", stco.data, 8)]
+        if offsets and max(offsets) > 0xFFFFFFFF:
+            raise ValueError("Deslocamento de chunk excede 32 bits (stco).")
+        stco.data = stco.data[:8] + struct.pack(f">{count}I", *offsets)
+    for co64 in moov.find_all(b"co64"):
+        count = struct.unpack_from(">I", co64.data, 4)[0]
+        offsets = [offset + delta if offset >= threshold else offset for offset in struct.unpack_from(f">{count}Q", co64.data, 8)]
+        co64.data = co64.data[:8] + struct.pack(f">{count}Q", *offsets)
+
+def _copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError("Arquivo MP4 truncado.")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+def plan_mp4_metadata(file_path, output_path, tags, handler_names=None):
+    # Decides how the new moov gets written without touching the file, so a
+    # dry run can report the same path write_mp4_metadata will take.
+    moov, ftyp, top_level, file_size = read_moov(file_path)
+    current = read_mp4_metadata(file_path)["format"]["tags"]
+    writable = {}
+    for tag, value in tags.items():
+        if tag in TAG_TO_ATOM or tag in PAIR_TAGS or tag in INTEGER_TAGS:
+            writable[tag] = value
+        elif str(value) != current.get(tag):
+            # Structural keys and keys without an ilst mapping here (e.g. a
+            # udta location) are left to the ffmpeg remux.
+            raise ValueError(f"O metadado {tag} exige remux pelo FFmpeg.")
+    _set_tags(moov, writable)
+    _set_handler_names(moov, handler_names or {})
+    new_moov = serialize_box(moov)
+
+    index = next(i for i, entry in enumerate(top_level) if entry[0] == b"moov")
+    moov_offset = top_level[index][1]
+    region_end = moov_offset + top_level[index][2]
+    for box_type, offset, size, _ in top_level[index + 1:]:
+        if box_type not in FREE_BOXES:
+            break
+        region_end = offset + size
+    available = region_end - moov_offset
+    moov_is_last = region_end == file_size
+    fits = len(new_moov) == available or len(new_moov) + 8 <= available
+    fragmented = moov.find(b"mvex") is not None
+    in_place = os.path.exists(output_path) and os.path.samefile(file_path, output_path)
+
+    padding = 0
+    if fits:
+        mode = "overwrite" if in_place else "copy"
+        padding = available - len(new_moov)
+    elif moov_is_last:
+        mode = "extend" if in_place else "copy"
+        padding = PADDING_SIZE
+    elif fragmented:
+        raise ValueError("MP4 fragmentado sem espaço para o novo moov.")
+    elif in_place:
+        # Leave the old moov as free space and append the new one, so no
+        # chunk offsets move. The file loses its fast-start layout.
+        mode = "append"
+        padding = PADDING_SIZE
+    else:
+        mode = "shift"
+        padding = PADDING_SIZE
+        shift_chunk_offsets(moov, region_end, len(new_moov) + padding - available)
+        new_moov = serialize_box(moov)
+    moov_bytes = len(new_moov) + padding
+    return {
+        "mode": mode,
+        "in_place": in_place,
+        "moov": new_moov,
+        "moov_offset": moov_offset,
+        "region_end": region_end,
+        "available": available,
+        "padding": padding,
+        "bytes_written": moov_bytes + (0 if in_place else file_size - available),
+    }
+
+def write_mp4_metadata(file_path, output_path, tags, handler_names=None):
+    plan = plan_mp4_metadata(file_path, output_path, tags, handler_names)
+    new_moov, moov_offset, padding = plan["moov"], plan["moov_offset"], plan["padding"]
+    if plan["in_place"]:
+        with open(file_path, "r+b") as f:
+            if plan["mode"] == "append":
+                f.seek(moov_offset)
+                f.write(struct.pack(">I4s", plan["available"], b"free"))
+                f.seek(0, os.SEEK_END)
+            else:
+                f.seek(moov_offset)
+            f.write(new_moov)
+            if padding:
+                f.write(free_box(padding))
+            if plan["mode"] == "extend":
+                f.truncate()
+        return output_path
+
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+            _copy_range(src, dst, 0, moov_offset)
+            dst.write(new_moov)
+            if padding:
+                dst.write(free_box(padding))
+            src.seek(plan["region_end"])
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
@@ -1,61 +1,490 @@
-import flet as ft
 from datetime import datetime
 import subprocess
 import os
 import json
 import platform
+import struct
+import threading
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import metrics
 
-def get_video_metadata(file_path):
+HANDLER_NAME = "ISO Media file produced by FlorianiStudio Inc."
+PROBE_CONCURRENCY = 4
+STDERR_TAIL_LINES = 50
+PROBE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".florianistudio", "probe_cache.json")
+
+THUMBNAIL_DIR = os.path.join(os.path.expanduser("~"), ".florianistudio", "thumbnails")
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_CONCURRENCY = 4
+POSTER_POSITION = 0.1
+POSTER_MAX_SECONDS = 10.0
+WATERMARK_OVERLAY_DIR = os.path.join(os.path.expanduser("~"), ".florianistudio", "overlays")
+DEFAULT_WATERMARK = "logo render.png"
+
+_probe_cache = {}
+_probe_cache_lock = threading.Lock()
+
+def get_video_metadata(file_path, native=False):
+    with metrics.stage("probe", file_path) as info:
+        if native and file_path.lower().endswith('.mp4'):
+            try:
+                from mp4_atoms import read_mp4_metadata
+                info["mode"] = "native"
+                return read_mp4_metadata(file_path)
+            except (ValueError, OSError, struct.error):
+                pass
+        info["mode"] = "ffprobe"
+        try:
+            cmd = [
+                'ffprobe', '-v', 'quiet', '-print_format', 'json',
+                '-show_format', '-show_streams', file_path
+            ]
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            if result.returncode != 0:
+                error = result.stderr
+            else:
+                metadata = json.loads(result.stdout)
+                return metadata
+        except Exception as e:
+            error = str(e)
+        info["ok"] = False
+        metrics.error("probe", error, file_path)
+        return {"error": error}
+
+def probe_video(file_path):
     try:
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_format', '-show_streams', file_path
-        ]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        if result.returncode != 0:
-            return {"error": result.stderr}
-        metadata = json.loads(result.stdout)
-        return metadata
-    except Exception as e:
+        stat = os.stat(file_path)
+    except OSError as e:
+        return {"error": str(e)}
+    key = os.path.abspath(file_path)
+    with _probe_cache_lock:
+        entry = _probe_cache.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        metrics.count("probe_cache", result="hit")
+        return entry["metadata"]
+    metrics.count("probe_cache", result="miss")
+    metadata = get_video_metadata(file_path)
+    if "error" not in metadata:
+        with _probe_cache_lock:
+            _probe_cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "metadata": metadata}
+    return metadata
+
+def probe_videos(file_paths, max_workers=PROBE_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return dict(zip(file_paths, executor.map(probe_video, file_paths)))
+
+def invalidate_probe(file_path):
+    with _probe_cache_lock:
+        _probe_cache.pop(os.path.abspath(file_path), None)
+
+def load_probe_cache(cache_path=PROBE_CACHE_PATH):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return
+    with _probe_cache_lock:
+        for key, entry in entries.items():
+            _probe_cache.setdefault(key, entry)
+
+def save_probe_cache(cache_path=PROBE_CACHE_PATH):
+    with _probe_cache_lock:
+        entries = dict(_probe_cache)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        metrics.log(f"Não foi possível salvar o cache de metadados: {str(e)}", level="warning")
+
+def thumbnail_cache_path(file_path, stat, width=THUMBNAIL_WIDTH, cache_dir=THUMBNAIL_DIR):
+    key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{width}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+def extract_poster_frame(file_path, width=THUMBNAIL_WIDTH, cache_dir=THUMBNAIL_DIR):
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
         return {"error": str(e)}
+    thumbnail_path = thumbnail_cache_path(file_path, stat, width, cache_dir)
+    if os.path.exists(thumbnail_path):
+        metrics.count("thumbnail_cache", result="hit")
+        return {"path": thumbnail_path}
+    metrics.count("thumbnail_cache", result="miss")
+    duration = get_duration(probe_with_fallback(file_path)) or 0.0
+    seek = min(POSTER_MAX_SECONDS, duration * POSTER_POSITION)
+    # Input-side -ss jumps to the keyframe before `seek`; with
+    # -noaccurate_seek that keyframe is the frame emitted, so only one frame
+    # is decoded regardless of the file length.
+    tmp_path = f"{thumbnail_path}.{os.getpid()}.{threading.get_ident()}.jpg"
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+        '-noaccurate_seek', '-ss', f"{seek:.3f}", '-i', file_path,
+        '-map', '0:v:0', '-frames:v', '1', '-an', '-sn',
+        '-vf', f"scale={width}:-2", '-q:v', '5', tmp_path
+    ]
+    with metrics.stage("thumbnail", file_path, seek=seek) as info:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        except OSError as e:
+            info["ok"] = False
+            metrics.error("thumbnail", str(e), file_path)
+            return {"error": str(e)}
+        if result.returncode != 0 or not os.path.exists(tmp_path):
+            info["ok"] = False
+            error = result.stderr.strip() or "Nenhum quadro extraído."
+            metrics.error("thumbnail", error, file_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return {"error": error}
+        os.replace(tmp_path, thumbnail_path)
+        info["bytes_out"] = os.path.getsize(thumbnail_path)
+    return {"path": thumbnail_path}
+
+def extract_poster_frames(file_paths, on_ready, max_workers=THUMBNAIL_CONCURRENCY, cancel_event=None, width=THUMBNAIL_WIDTH):
+    # Calls on_ready(file_path, result) as each thumbnail finishes, in
+    # completion order, so callers can fill in their UI progressively.
+    def extract(file_path):
+        if cancel_event is not None and cancel_event.is_set():
+            return {"error": "Operação cancelada."}
+        return extract_poster_frame(file_path, width)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="thumbnail") as executor:
+        futures = {executor.submit(extract, file_path): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            on_ready(futures[future], future.result())
+
+def get_duration(metadata):
+    try:
+        return float(metadata.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        return None
+
+def probe_duration(file_path):
+    return get_duration(probe_with_fallback(file_path))
+
+def _parse_progress(values, duration):
+    out_time_us = values.get('out_time_us') or values.get('out_time_ms')
+    try:
+        out_time = int(out_time_us) / 1_000_000
+    except (TypeError, ValueError):
+        out_time = 0.0
+    try:
+        fps = float(values.get('fps', 0))
+    except ValueError:
+        fps = 0.0
+    try:
+        speed = float(values.get('speed', '0').rstrip('x'))
+    except ValueError:
+        speed = 0.0
+    progress = {
+        "out_time": out_time,
+        "fps": fps,
+        "speed": speed,
+        "percent": None,
+        "eta": None,
+        "done": values.get('progress') == 'end'
+    }
+    if duration:
+        progress["percent"] = min(100.0, out_time / duration * 100)
+        if speed > 0:
+            progress["eta"] = max(0.0, (duration - out_time) / speed)
+    return progress
+
+def run_ffmpeg(cmd, duration=None, on_progress=None, cancel_event=None):
+    cmd = [cmd[0], '-hide_banner', '-nostats', '-progress', 'pipe:1'] + cmd[1:]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.rstrip())
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+    values = {}
+    cancelled = False
+    for line in process.stdout:
+        if cancel_event is not None and cancel_event.is_set():
+            process.kill()
+            cancelled = True
+            break
+        key, _, value = line.strip().partition('=')
+        values[key] = value
+        if key == 'progress':
+            if on_progress:
+                on_progress(_parse_progress(values, duration))
+            values = {}
+    process.wait()
+    stderr_thread.join()
+    return process.returncode, "\n".join(stderr_tail), cancelled
+
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "vp9": "libvpx-vp9", "av1": "libaom-av1", "mpeg4": "mpeg4"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus", "ac3": "ac3", "eac3": "eac3", "flac": "flac"}
+PRESET_ENCODERS = {"libx264", "libx265"}
+DEFAULT_PRESET = "medium"
+# Rough libx264 throughput on 8 threads, in pixels per second; only used
+# for the dry-run cost estimate.
+ENCODE_PIXEL_RATE = {
+    "ultrafast": 400e6, "superfast": 300e6, "veryfast": 200e6, "faster": 140e6, "fast": 110e6,
+    "medium": 80e6, "slow": 40e6, "slower": 20e6, "veryslow": 8e6,
+}
+COPY_BYTES_PER_SECOND = 200 * 1024 * 1024
+AUDIO_ENCODE_SPEED = 100
+# Rendering the tiled overlay PNG: mostly fixed logo setup plus the layer
+# compositing and PNG write, measured on 720p-4K frames.
+OVERLAY_RENDER_BASE_SECONDS = 1.2
+OVERLAY_RENDER_PIXEL_RATE = 10e6
+
+def probe_with_fallback(file_path):
+    metadata = probe_video(file_path)
+    if "error" in metadata:
+        metadata = get_video_metadata(file_path, native=True)
+    return {} if "error" in metadata else metadata
+
+def _first_stream(metadata, codec_type):
+    return next((stream for stream in metadata.get("streams", []) if stream.get("codec_type") == codec_type), {})
 
-def update_video_metadata(file_path, new_metadata, output_path, video_filters=None, audio_filters=None):
+def _frame_rate(stream):
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = str(stream.get(key, "")).partition("/")
+        try:
+            rate = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            continue
+        if rate > 0:
+            return rate
+    return None
+
+def plan_streams(metadata, video_filters=None, audio_filters=None, preset=None, crf=None):
+    # Unfiltered streams are stream-copied; filtered ones are re-encoded with
+    # the source codec family, bitrate and pixel format where known.
+    video = _first_stream(metadata, "video")
+    audio = _first_stream(metadata, "audio")
+    plan = {"video": {"action": "copy", "args": []}, "audio": {"action": "copy", "args": []}}
+    if video_filters:
+        encoder = VIDEO_ENCODERS.get(video.get("codec_name"), "libx264")
+        args = ['-c:v', encoder]
+        if encoder in PRESET_ENCODERS:
+            args.extend(['-preset', preset or DEFAULT_PRESET])
+        if crf is not None:
+            args.extend(['-crf', str(crf)])
+        elif video.get("bit_rate"):
+            args.extend(['-b:v', str(video["bit_rate"])])
+        if video.get("pix_fmt"):
+            args.extend(['-pix_fmt', video["pix_fmt"]])
+        plan["video"] = {"action": "encode", "encoder": encoder, "args": args}
+    if audio_filters:
+        encoder = AUDIO_ENCODERS.get(audio.get("codec_name"), "aac")
+        args = ['-c:a', encoder]
+        if audio.get("bit_rate") and encoder != "flac":
+            args.extend(['-b:a', str(audio["bit_rate"])])
+        plan["audio"] = {"action": "encode", "encoder": encoder, "args": args}
+    return plan
+
+def estimate_plan_cost(metadata, plan, threads=None, preset=None):
+    duration = get_duration(metadata) or 0.0
     try:
-        cmd = ['ffmpeg', '-i', file_path]
+        size = int(metadata.get("format", {}).get("size", 0))
+    except (TypeError, ValueError):
+        size = 0
+    seconds = size / COPY_BYTES_PER_SECOND
+    if plan["video"]["action"] == "encode":
+        video = _first_stream(metadata, "video")
+        pixels = (video.get("width") or 1920) * (video.get("height") or 1080)
+        frames = duration * (_frame_rate(video) or 30.0)
+        workers = min(threads or os.cpu_count() or 1, 16)
+        seconds += frames * pixels / (ENCODE_PIXEL_RATE.get(preset or DEFAULT_PRESET, ENCODE_PIXEL_RATE[DEFAULT_PRESET]) * workers / 8)
+    if plan["audio"]["action"] == "encode":
+        seconds += duration / AUDIO_ENCODE_SPEED
+    return {"duration": duration, "estimated_seconds": round(seconds, 1)}
+
+def watermark_overlay_path(watermark_path, size, opacity=None, scale=None, cache_dir=WATERMARK_OVERLAY_DIR):
+    from florianistudio import WATERMARK_OPACITY, WATERMARK_SCALE
+
+    opacity = WATERMARK_OPACITY if opacity is None else opacity
+    scale = WATERMARK_SCALE if scale is None else scale
+    stat = os.stat(watermark_path)
+    key = f"{os.path.abspath(watermark_path)}|{stat.st_size}|{stat.st_mtime_ns}|{size[0]}x{size[1]}|{opacity}|{scale}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+def render_watermark_overlay(watermark_path, size, opacity=None, scale=None, cache_dir=WATERMARK_OVERLAY_DIR):
+    # The same tiled layer apply_watermark composites onto photos, rendered
+    # once per video resolution and kept on disk for ffmpeg's overlay filter.
+    from florianistudio import WATERMARK_OPACITY, WATERMARK_SCALE, get_watermark_layer
+
+    opacity = WATERMARK_OPACITY if opacity is None else opacity
+    scale = WATERMARK_SCALE if scale is None else scale
+    overlay_path = watermark_overlay_path(watermark_path, size, opacity, scale, cache_dir)
+    if os.path.exists(overlay_path):
+        return overlay_path
+    with metrics.stage("watermark_overlay", watermark_path, width=size[0], height=size[1]) as info:
+        layer = get_watermark_layer(watermark_path, size, opacity, scale)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{overlay_path}.{os.getpid()}.{threading.get_ident()}.png"
+        layer.save(tmp_path, "png", compress_level=1)
+        os.replace(tmp_path, overlay_path)
+        info["bytes_out"] = os.path.getsize(overlay_path)
+    return overlay_path
+
+def plan_video_update(file_path, new_metadata, output_path, video_filters=None, audio_filters=None, threads=None, preset=None, crf=None, watermark_path=None, dry_run=False):
+    metadata = probe_with_fallback(file_path) if video_filters or audio_filters or watermark_path else {}
+    streams = plan_streams(metadata, video_filters or watermark_path, audio_filters, preset, crf)
+    cmd = ['ffmpeg', '-y', '-nostdin', '-i', file_path]
+    overlay = None
+    if watermark_path:
+        video = _first_stream(metadata, "video")
+        if not video.get("width") or not video.get("height"):
+            raise ValueError("Não foi possível determinar a resolução do vídeo para a marca d'água.")
+        size = (video["width"], video["height"])
+        if dry_run:
+            # Only report where the overlay would go and what rendering it
+            # would cost; the PNG is written by the real run.
+            overlay_path = watermark_overlay_path(watermark_path, size)
+            cached = os.path.exists(overlay_path)
+            overlay = {
+                "path": overlay_path,
+                "cached": cached,
+                "estimated_seconds": 0.0 if cached else round(OVERLAY_RENDER_BASE_SECONDS + size[0] * size[1] / OVERLAY_RENDER_PIXEL_RATE, 1),
+            }
+        else:
+            overlay = {"path": render_watermark_overlay(watermark_path, size), "cached": True, "estimated_seconds": 0.0}
+        cmd.extend(['-i', overlay["path"]])
+        # Overlay first, at the source resolution, then the user's filters,
+        # all in one graph so the video is decoded and encoded only once.
+        graph = "[0:v:0][1:v]overlay=0:0"
+        if video_filters:
+            graph += f",{video_filters}"
+        graph += "[vout]"
+        if audio_filters:
+            graph += f";[0:a:0]{audio_filters}[aout]"
+        cmd.extend(['-filter_complex', graph, '-map', '[vout]', '-map', '[aout]' if audio_filters else '0:a:0?'])
+    else:
         if video_filters:
-            print(f"Aplicando filtros de vídeo: {video_filters}")
             cmd.extend(['-vf', video_filters])
-        
         if audio_filters:
-            print(f"Aplicando filtros de áudio: {audio_filters}")  
             cmd.extend(['-af', audio_filters])
+    for key, value in new_metadata.items():
+        cmd.extend(['-metadata', f'{key}={value}'])
+    cmd.extend(['-metadata:s:v:0', f'handler_name={HANDLER_NAME}'])
+    cmd.extend(['-metadata:s:a:0', f'handler_name={HANDLER_NAME}'])
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    # Copy everything by default; the per-stream options below override it
+    # only for the streams that are filtered.
+    cmd.extend(['-c', 'copy'])
+    for stream in streams.values():
+        cmd.extend(stream["args"])
+    cmd.append(output_path)
+    estimate = estimate_plan_cost(metadata, streams, threads, preset) if metadata else None
+    if estimate and overlay:
+        estimate["estimated_seconds"] = round(estimate["estimated_seconds"] + overlay["estimated_seconds"], 1)
+    return {
+        "command": cmd,
+        "streams": streams,
+        "reencoded": [name for name, stream in streams.items() if stream["action"] == "encode"],
+        "metadata": metadata,
+        "watermark": watermark_path,
+        "overlay": overlay,
+        "estimate": estimate,
+    }
+
+def describe_plan(plan):
+    parts = []
+    for name, label in (("video", "vídeo"), ("audio", "áudio")):
+        stream = plan["streams"][name]
+        parts.append(f"{label}: {'copiar' if stream['action'] == 'copy' else 're-encodificar com ' + stream['encoder']}")
+    overlay = plan.get("overlay")
+    if overlay:
+        parts.append(f"marca d'água: {overlay['path']} ({'em cache' if overlay['cached'] else 'a renderizar'})")
+    if plan["estimate"]:
+        parts.append(f"custo estimado ~{plan['estimate']['estimated_seconds']}s")
+    return ", ".join(parts)
+
+NATIVE_MODES = {
+    "overwrite": "reescrever o moov no lugar",
+    "extend": "reescrever o moov no fim do arquivo",
+    "append": "anexar um novo moov no fim do arquivo",
+    "copy": "copiar com o novo moov",
+    "shift": "copiar com o novo moov e deslocar os offsets dos chunks",
+}
 
+def describe_native_plan(plan):
+    seconds = plan["bytes_written"] / COPY_BYTES_PER_SECOND
+    return f"edição direta dos átomos MP4: {NATIVE_MODES[plan['mode']]}, {plan['bytes_written']} bytes gravados, custo estimado ~{round(seconds, 1)}s"
+
+SUCCESS_MESSAGE = "Metadados e conteúdo atualizados com sucesso."
+
+def video_result(status, message, error=None):
+    # status is "done", "cancelled", "error" or "planned" (dry run); message
+    # is only for display, callers branch on status.
+    return {"status": status, "message": message, "error": error}
+
+def update_video_metadata(file_path, new_metadata, output_path, video_filters=None, audio_filters=None, native=True, threads=None, cancel_event=None, on_progress=None, preset=None, crf=None, dry_run=False, watermark_path=None):
+    if native and not video_filters and not audio_filters and not watermark_path and file_path.lower().endswith('.mp4'):
+        try:
+            from mp4_atoms import plan_mp4_metadata, write_mp4_metadata
+            if dry_run:
+                summary = describe_native_plan(plan_mp4_metadata(file_path, output_path, new_metadata, {"video": HANDLER_NAME, "audio": HANDLER_NAME}))
+                metrics.log(f"Simulação: {summary}")
+                return video_result("planned", f"Simulação: {summary}")
+            with metrics.stage("mp4_atoms", file_path, bytes_in=os.path.getsize(file_path)) as info:
+                write_mp4_metadata(file_path, output_path, new_metadata, {"video": HANDLER_NAME, "audio": HANDLER_NAME})
+                info["bytes_out"] = os.path.getsize(output_path)
+            # An in-place "overwrite" keeps the file size, so on filesystems
+            # with coarse mtimes the cached probe would still look current.
+            invalidate_probe(output_path)
+            metrics.log(f"Metadados gravados diretamente nos átomos MP4: {output_path}")
+            return video_result("done", SUCCESS_MESSAGE)
+        except (ValueError, OSError, struct.error) as e:
+            metrics.log(f"Edição direta do MP4 indisponível ({str(e)}), usando FFmpeg.", level="warning")
+    try:
+        plan = plan_video_update(file_path, new_metadata, output_path, video_filters, audio_filters, threads, preset, crf, watermark_path, dry_run)
+        cmd = plan["command"]
+        if watermark_path:
+            metrics.log(f"Aplicando marca d'água: {watermark_path}")
+        if video_filters:
+            metrics.log(f"Aplicando filtros de vídeo: {video_filters}")
+        if audio_filters:
+            metrics.log(f"Aplicando filtros de áudio: {audio_filters}")
         for key, value in new_metadata.items():
-            cmd.extend(['-metadata', f'{key}={value}'])
-            print(f"Adicionando metadado: {key}={value}")  
-        handler_name = "ISO Media file produced by FlorianiStudio Inc."
-        cmd.extend(['-metadata:s:v:0', f'handler_name={handler_name}'])
-        cmd.extend(['-metadata:s:a:0', f'handler_name={handler_name}'])
-        print(f"Adicionando handler_name para vídeo e áudio: {handler_name}")  
-        if video_filters or audio_filters:
-            cmd.extend(['-c:v', 'libx264', '-c:a', 'aac', output_path])
-            print(f"Re-encodificando com libx264 e aac para: {output_path}")  
-        else:
-            cmd.extend(['-codec', 'copy', output_path])
-            print(f"Copiando codecs para: {output_path}") 
-        
-        print(f"Comando FFmpeg: {' '.join(cmd)}") 
-        
-        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        
-        if process.returncode != 0:
-            print(f"Erro no FFmpeg: {process.stderr}") 
-            return f"Erro: {process.stderr}"
-        print("Processo concluído com sucesso.")  
-        return "Metadados e conteúdo atualizados com sucesso."
+            metrics.log(f"Adicionando metadado: {key}={value}", level="debug")
+        metrics.log(f"Adicionando handler_name para vídeo e áudio: {HANDLER_NAME}", level="debug")
+        summary = describe_plan(plan)
+        if dry_run:
+            metrics.log(f"Simulação: {summary}")
+            return video_result("planned", f"Simulação: {summary} | Comando: {' '.join(cmd)}")
+        metrics.log(f"{summary} -> {output_path}")
+        metrics.log(f"Comando FFmpeg: {' '.join(cmd)}", level="debug")
+
+        duration = None
+        if on_progress:
+            duration = get_duration(plan["metadata"]) if plan["metadata"] else probe_duration(file_path)
+        mode = "encode" if plan["reencoded"] else "copy"
+        with metrics.stage("ffmpeg", file_path, mode=mode, reencoded=",".join(plan["reencoded"]), bytes_in=os.path.getsize(file_path)) as info:
+            returncode, stderr, cancelled = run_ffmpeg(cmd, duration, on_progress, cancel_event)
+            info["ok"] = returncode == 0 and not cancelled
+            if info["ok"]:
+                info["bytes_out"] = os.path.getsize(output_path)
+        if cancelled:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            metrics.log("Processo cancelado.")
+            return video_result("cancelled", "Operação cancelada.")
+
+        if returncode != 0:
+            metrics.error("ffmpeg", stderr, file_path)
+            return video_result("error", f"Erro: {stderr}", stderr)
+        metrics.log("Processo concluído com sucesso.")
+        return video_result("done", SUCCESS_MESSAGE)
     except Exception as e:
-        print(f"Exceção: {str(e)}")  
-        return f"Erro ao atualizar metadados: {str(e)}"
+        metrics.error("ffmpeg", str(e), file_path)
+        return video_result("error", f"Erro ao atualizar metadados: {str(e)}", str(e))
 
 def open_folder(file_path):
     folder = os.path.dirname(file_path)
@@ -66,35 +495,96 @@ def open_folder(file_path):
     else:  
         subprocess.Popen(["xdg-open", folder])
 
-def generate_output_path(file_path, suffix="_edited"):
+def format_progress(progress):
+    parts = []
+    if progress.get("percent") is not None:
+        parts.append(f"{progress['percent']:.0f}%")
+    if progress.get("eta") is not None:
+        minutes, seconds = divmod(int(progress["eta"]), 60)
+        parts.append(f"ETA {minutes:02d}:{seconds:02d}")
+    if progress.get("speed"):
+        parts.append(f"{progress['speed']:.2f}x")
+    if progress.get("fps"):
+        parts.append(f"{progress['fps']:.0f} fps")
+    return " | ".join(parts)
+
+def video_operation_params(new_metadata, output_path, video_filters=None, audio_filters=None, preset=None, crf=None, watermark_path=None):
+    params = {
+        "op": "video",
+        "metadata": new_metadata,
+        "output_path": os.path.abspath(output_path),
+        "video_filters": video_filters,
+        "audio_filters": audio_filters,
+        "handler_name": HANDLER_NAME,
+    }
+    if preset or crf is not None:
+        params["encoder"] = {"preset": preset, "crf": crf}
+    if watermark_path:
+        from output_cache import file_fingerprint
+        params["watermark"] = file_fingerprint(watermark_path)
+    return params
+
+def generate_output_path(file_path, suffix="_edited", output_dir=None):
     base, ext = os.path.splitext(file_path)
+    if output_dir:
+        base = os.path.join(output_dir, os.path.basename(base))
     return f"{base}{suffix}{ext}"
 
-def camouflage_video(file_path, output_path):
-    video_filters = (
-        "scale='2*trunc(iw*1.01/2)':'2*trunc(ih*1.01/2)',"
-        "fps=59.94,"
-        "eq=brightness=0.01:saturation=1.01"
-    )
-    
-    audio_filters = "atempo=1.01,asetrate=44110"
-    
-    new_metadata = {
-        "title": "FlorianiStudio",
-        "description": "Este é um vídeo camuflado.",
-        "artist": "FlorianiStudio",
-        "copyright": "© 2024 FlorianiStudio"
-    }
-    
+CAMOUFLAGE_VIDEO_FILTERS = (
+    "scale='2*trunc(iw*1.01/2)':'2*trunc(ih*1.01/2)',"
+    "fps=59.94,"
+    "eq=brightness=0.01:saturation=1.01"
+)
+
+CAMOUFLAGE_AUDIO_FILTERS = "atempo=1.01,asetrate=44110"
+
+CAMOUFLAGE_METADATA = {
+    "title": "FlorianiStudio",
+    "description": "Este é um vídeo camuflado.",
+    "artist": "FlorianiStudio",
+    "copyright": "© 2024 FlorianiStudio"
+}
+
+def camouflage_video(file_path, output_path, **kwargs):
     return update_video_metadata(
         file_path,
-        new_metadata,
+        CAMOUFLAGE_METADATA,
         output_path,
-        video_filters=video_filters,
-        audio_filters=audio_filters
+        video_filters=CAMOUFLAGE_VIDEO_FILTERS,
+        audio_filters=CAMOUFLAGE_AUDIO_FILTERS,
+        **kwargs
     )
 
-def main(page: ft.Page):
+CARD_PAGE_SIZE = 30
+SCROLL_LOAD_MARGIN = 300
+HIDDEN_FORMAT_PROPERTIES = [
+    'tags', 'filename', 'nb_streams', 'nb_programs', 'format_long_name',
+    'start_time', 'duration', 'size', 'bit_rate', 'probe_score'
+]
+
+def editable_tags(metadata):
+    format_info = metadata.get('format', {})
+    tags = dict(format_info.get('tags', {}))
+    for prop, value in format_info.items():
+        if prop not in HIDDEN_FORMAT_PROPERTIES:
+            tags[prop] = value
+    return tags
+
+def parse_tag_lines(text):
+    tags = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition("=")
+        if sep and key.strip():
+            tags[key.strip()] = value.strip()
+    return tags
+
+def main(page: "ft.Page"):
+    import flet as ft
+    from video_jobs import VideoJobScheduler, STATUS_LABELS
+    from output_cache import OutputCache
+    from metadata_catalog import MetadataCatalog
+    from ui_tasks import BackgroundTask, UpdateThrottle
+
     page.title = "Editor de Metadados de Vídeos MP4"
     page.window.width = 1400
     page.window.height = 900
@@ -102,12 +592,12 @@ def main(page: ft.Page):
     page.spacing = 20
     page.theme_mode = ft.ThemeMode.LIGHT
     page.scroll = ft.ScrollMode.AUTO
+    load_probe_cache()
+    catalog = MetadataCatalog()
 
     selected_files = []
-    metadata_fields = {}
-    video_filters_field = {}
-    audio_filters_field = {}
-    metadata_display = ft.Column(scroll='auto')
+    file_states = {}
+    metadata_display = ft.ListView(spacing=10, height=600, on_scroll_interval=100)
     output_message = ft.Text("Selecione um ou mais vídeos MP4 para editar os metadados.", size=14)
     output_card = ft.Card(
         content=ft.Container(
@@ -121,126 +611,290 @@ def main(page: ft.Page):
         margin=ft.margin.only(top=10)
     )
 
+    def fill_paged(list_view, items, build):
+        # Only CARD_PAGE_SIZE cards exist as controls at first; the next page
+        # is built when the user scrolls near the end of the list.
+        rendered = 0
+
+        def render_next_page():
+            nonlocal rendered
+            list_view.controls.extend(build(item) for item in items[rendered:rendered + CARD_PAGE_SIZE])
+            rendered = min(len(items), rendered + CARD_PAGE_SIZE)
+
+        def on_scroll(e):
+            if rendered < len(items) and e.pixels >= e.max_scroll_extent - SCROLL_LOAD_MARGIN:
+                render_next_page()
+                list_view.update()
+
+        list_view.controls = []
+        list_view.on_scroll = on_scroll
+        render_next_page()
+
+    def bind(mapping, key):
+        def on_change(e):
+            mapping[key] = e.control.value
+        return on_change
+
+    def build_editor_fields(file_path):
+        state = file_states[file_path]
+        values = state["values"]
+        fields = [
+            ft.TextField(label=tag.capitalize(), value=values[tag], width=400, on_change=bind(values, tag))
+            for tag in sorted(values)
+        ]
+        fields.append(ft.TextField(
+            label="Filtros de Vídeo (FFmpeg)",
+            hint_text="Exemplo: scale=1280:720,fps=30",
+            value=state["video_filters"],
+            width=600,
+            on_change=bind(state, "video_filters")
+        ))
+        fields.append(ft.TextField(
+            label="Filtros de Áudio (FFmpeg)",
+            hint_text="Exemplo: atempo=1.25,volume=0.8",
+            value=state["audio_filters"],
+            width=600,
+            on_change=bind(state, "audio_filters")
+        ))
+        return fields
+
+    def toggle_editor(file_path, button):
+        editor = file_states[file_path]["editor"]
+        if not editor.controls:
+            editor.controls = build_editor_fields(file_path)
+        editor.visible = not editor.visible
+        button.icon = ft.icons.EXPAND_LESS if editor.visible else ft.icons.EXPAND_MORE
+        editor.update()
+        button.update()
+
+    def build_file_card(file_path):
+        state = file_states[file_path]
+        state["checkbox"] = ft.Checkbox(value=state["selected"], on_change=bind(state, "selected"))
+        state["status_control"] = ft.Text(state["status"], size=12, color=state["status_color"])
+        state["editor"] = ft.Column(spacing=10, visible=False)
+        state["thumbnail_control"] = ft.Container(
+            content=build_thumbnail(state["thumbnail"]),
+            width=THUMBNAIL_WIDTH // 2,
+            height=THUMBNAIL_WIDTH * 9 // 32,
+            bgcolor=ft.colors.GREY_200,
+            border_radius=ft.border_radius.all(5),
+            alignment=ft.alignment.center
+        )
+        expand_button = ft.IconButton(
+            icon=ft.icons.EXPAND_MORE,
+            tooltip="Editar metadados",
+            on_click=lambda e: toggle_editor(file_path, e.control)
+        )
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Row([
+                        state["checkbox"],
+                        state["thumbnail_control"],
+                        ft.Text(f"Arquivo: {os.path.basename(file_path)}", size=16, weight=ft.FontWeight.BOLD, expand=True),
+                        ft.Text(f"{len(state['values'])} tag(s)", size=12, color=ft.colors.GREY_700),
+                        expand_button
+                    ]),
+                    state["status_control"],
+                    state["editor"]
+                ], spacing=10),
+                padding=10,
+                border_radius=ft.border_radius.all(10),
+                bgcolor=ft.colors.WHITE,
+            ),
+            elevation=3
+        )
+
+    def build_thumbnail(thumbnail_path):
+        if thumbnail_path:
+            return ft.Image(src=thumbnail_path, fit=ft.ImageFit.COVER, border_radius=ft.border_radius.all(5))
+        return ft.Icon(ft.icons.MOVIE, color=ft.colors.GREY_500)
+
+    throttle = UpdateThrottle(page)
+
+    def on_thumbnail(file_path, result):
+        state = file_states.get(file_path)
+        if state is None or "error" in result:
+            return
+        state["thumbnail"] = result["path"]
+        if "thumbnail_control" in state:
+            state["thumbnail_control"].content = build_thumbnail(result["path"])
+            throttle.request()
+
+    thumbnail_cancel = threading.Event()
+
+    def load_thumbnails(file_paths):
+        # Runs on its own thread so a new selection can be made while the
+        # previous thumbnails are still being extracted.
+        nonlocal thumbnail_cancel
+        thumbnail_cancel.set()
+        thumbnail_cancel = threading.Event()
+        threading.Thread(
+            target=extract_poster_frames,
+            args=(file_paths, on_thumbnail),
+            kwargs={"cancel_event": thumbnail_cancel},
+            name="thumbnails",
+            daemon=True
+        ).start()
+
+    def on_task_state(busy):
+        pick_button.disabled = busy
+        progress_bar.visible = busy or bool(scheduler.pending())
+        if busy:
+            progress_bar.value = None
+        cancel_button.disabled = not busy and not scheduler.pending()
+        throttle.request()
+
+    task = BackgroundTask(page, on_state=on_task_state)
+
     def on_files_upload(e):
+        if not e.files:
+            output_message.value = "Nenhum arquivo selecionado."
+            update_buttons()
+            page.update()
+            return
+        if not task.start(load_files, [file.path for file in e.files]):
+            output_message.value = "Aguarde o carregamento atual terminar."
+            page.update()
+            return
+        output_message.value = f"Lendo metadados de {len(e.files)} arquivo(s)..."
+        page.update()
+
+    def load_files(cancel_event, file_paths):
         nonlocal selected_files
         try:
-            if e.files:
-                selected_files = []
-                metadata_display.controls.clear()
-
-                for file in e.files:
-                    file_path = file.path
-                    if not file_path.lower().endswith('.mp4'):
-                        output_message.value = f"Arquivo {os.path.basename(file_path)} não é um MP4 válido."
-                        continue
-
-                    metadata = get_video_metadata(file_path)
-                    if "error" in metadata:
-                        output_message.value = f"Erro ao extrair metadados de {os.path.basename(file_path)}: {metadata['error']}"
-                        continue
-
-                    selected_files.append(file_path)
-
-                    fields = {}
-                    format_tags = metadata.get('format', {}).get('tags', {})
-                    format_properties = {k: v for k, v in metadata.get('format', {}).items() if k not in [
-                        'tags', 'filename', 'nb_streams', 'nb_programs', 'format_long_name',
-                        'start_time', 'duration', 'size', 'bit_rate', 'probe_score']}
-
-                    all_format_tags = format_tags.copy()
-                    for prop, value in format_properties.items():
-                        all_format_tags[prop] = value
-
-                    for tag, value in all_format_tags.items():
-                        fields[tag] = ft.TextField(
-                            label=tag.capitalize(),
-                            value=str(value),
-                            width=400
-                        )
-
-                    video_filters_field[file_path] = ft.TextField(
-                        label="Filtros de Vídeo (FFmpeg)",
-                        hint_text="Exemplo: scale=1280:720,fps=30",
-                        width=600
-                    )
-                    audio_filters_field[file_path] = ft.TextField(
-                        label="Filtros de Áudio (FFmpeg)",
-                        hint_text="Exemplo: atempo=1.25,volume=0.8",
-                        width=600
-                    )
-
-                    metadata_display.controls.append(
-                        ft.Card(
-                            content=ft.Container(
-                                content=ft.Column([
-                                    ft.Text(f"Arquivo: {os.path.basename(file_path)}", size=16, weight=ft.FontWeight.BOLD),
-                                    *[fields[tag] for tag in sorted(fields.keys())],
-                                    video_filters_field[file_path],
-                                    audio_filters_field[file_path]
-                                ], spacing=10),
-                                padding=10,
-                                border_radius=ft.border_radius.all(10),
-                                bgcolor=ft.colors.WHITE,
-                            ),
-                            elevation=3,
-                            margin=ft.margin.only(bottom=20)
-                        )
-                    )
-
-                    metadata_fields[file_path] = fields
-
-                if selected_files:
-                    output_message.value = f"{len(selected_files)} arquivo(s) selecionado(s) para edição."
-                else:
-                    output_message.value = "Nenhum arquivo válido selecionado."
-
-                update_buttons()
-                page.update()
+            selected_files = []
+            file_states.clear()
+            probed = probe_videos([file_path for file_path in file_paths if file_path.lower().endswith('.mp4')])
+            if cancel_event.is_set():
+                output_message.value = "Carregamento cancelado."
+                throttle.flush()
+                return
+
+            for file_path in file_paths:
+                if not file_path.lower().endswith('.mp4'):
+                    output_message.value = f"Arquivo {os.path.basename(file_path)} não é um MP4 válido."
+                    continue
+
+                metadata = probed[file_path]
+                if "error" in metadata:
+                    output_message.value = f"Erro ao extrair metadados de {os.path.basename(file_path)}: {metadata['error']}"
+                    continue
+
+                selected_files.append(file_path)
+                file_states[file_path] = {
+                    "values": {tag: str(value) for tag, value in editable_tags(metadata).items()},
+                    "video_filters": "",
+                    "audio_filters": "",
+                    "selected": True,
+                    "status": "",
+                    "status_color": ft.colors.GREY_700,
+                    "thumbnail": None,
+                }
+
+            fill_paged(metadata_display, selected_files, build_file_card)
+            load_thumbnails(list(selected_files))
+            catalog.store_many([(file_path, "video", probed[file_path], None) for file_path in selected_files])
+            save_probe_cache()
+            if selected_files:
+                output_message.value = f"{len(selected_files)} arquivo(s) selecionado(s) para edição."
             else:
-                output_message.value = "Nenhum arquivo selecionado."
-                update_buttons()
-                page.update()
+                output_message.value = "Nenhum arquivo válido selecionado."
+
+            update_buttons(update=False)
+            throttle.flush()
         except Exception as err:
             output_message.value = f"Erro ao processar os arquivos: {str(err)}"
-            page.update()
+            throttle.flush()
+
+    def checked_files():
+        return [file_path for file_path in selected_files if file_states[file_path]["selected"]]
+
+    def set_all_selected(value):
+        for state in file_states.values():
+            state["selected"] = value
+            if "checkbox" in state:
+                state["checkbox"].value = value
+        metadata_display.update()
+
+    def apply_bulk_tags(e):
+        tags = parse_tag_lines(bulk_tags_field.value or "")
+        targets = checked_files()
+        if not tags or not targets:
+            output_message.value = "Informe ao menos uma tag (chave=valor) e selecione os arquivos."
+            output_message.update()
+            return
+        for file_path in targets:
+            state = file_states[file_path]
+            state["values"].update(tags)
+            if state.get("editor") is not None and state["editor"].controls:
+                state["editor"].controls = build_editor_fields(file_path)
+        output_message.value = f"{len(tags)} tag(s) aplicada(s) a {len(targets)} arquivo(s). Clique em salvar para gravar."
+        page.update()
+
+    def without_running_jobs(targets, suffix):
+        # A second click must not start another job writing the same output.
+        busy_outputs = {job.output_path for job in scheduler.pending()}
+        return [file_path for file_path in targets if generate_output_path(file_path, suffix) not in busy_outputs]
+
+    def selected_watermark():
+        return DEFAULT_WATERMARK if watermark_switch.value else None
 
     def save_metadata(e):
         try:
-            if not selected_files:
-                output_message.value = "Nenhum arquivo selecionado para salvar."
+            targets = without_running_jobs(checked_files(), "_edited")
+            if not targets:
+                output_message.value = "Nenhum arquivo selecionado para salvar (ou já em processamento)."
                 page.update()
                 return
 
-            for file_path in selected_files:
-                fields = metadata_fields.get(file_path, {})
+            for file_path in targets:
+                state = file_states[file_path]
                 new_metadata = {}
 
-                for tag, field in fields.items():
-                    if field.value.strip():
-                        new_metadata[tag] = field.value.strip()
+                for tag, value in state["values"].items():
+                    if value.strip():
+                        new_metadata[tag] = value.strip()
 
-                video_filters = video_filters_field[file_path].value.strip()
-                video_filters = video_filters if video_filters else None
-
-                audio_filters = audio_filters_field[file_path].value.strip()
-                audio_filters = audio_filters if audio_filters else None
+                video_filters = state["video_filters"].strip() or None
+                audio_filters = state["audio_filters"].strip() or None
 
                 output_path = generate_output_path(file_path)
 
-                result = update_video_metadata(
+                scheduler.submit(
                     file_path,
-                    new_metadata,
                     output_path,
+                    new_metadata,
                     video_filters=video_filters,
-                    audio_filters=audio_filters
+                    audio_filters=audio_filters,
+                    watermark_path=selected_watermark()
                 )
-                output_message.value = result
 
             page.update()
         except Exception as err:
             output_message.value = f"Erro ao salvar metadados: {str(err)}"
             page.update()
 
+    def build_metadata_card(file_path):
+        # Probing already filled the catalog; never re-read on the UI thread.
+        metadata = catalog.get(file_path, refresh=False)
+        if metadata is None:
+            return ft.Text(f"Metadados de {os.path.basename(file_path)} ainda não catalogados.", color=ft.colors.GREY_700)
+        if "error" in metadata:
+            return ft.Text(f"Erro em {os.path.basename(file_path)}: {metadata['error']}", color=ft.colors.RED)
+        return ft.Card(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Text(f"Arquivo: {os.path.basename(file_path)}", size=16, weight=ft.FontWeight.BOLD),
+                    *[ft.Text(f"{k.capitalize()}: {v}") for k, v in sorted(editable_tags(metadata).items())]
+                ], spacing=5),
+                padding=10,
+                border_radius=ft.border_radius.all(10),
+                bgcolor=ft.colors.WHITE,
+            ),
+            elevation=2
+        )
+
     def show_metadata(e):
         try:
             if not selected_files:
@@ -248,38 +902,8 @@ def main(page: ft.Page):
                 page.update()
                 return
 
-            metadata_info = ft.Column()
-
-            for file_path in selected_files:
-                metadata = get_video_metadata(file_path)
-                if "error" in metadata:
-                    metadata_info.controls.append(ft.Text(f"Erro em {os.path.basename(file_path)}: {metadata['error']}", color=ft.colors.RED))
-                    continue
-
-                format_tags = metadata.get('format', {}).get('tags', {})
-                format_properties = {k: v for k, v in metadata.get('format', {}).items() if k not in [
-                    'tags', 'filename', 'nb_streams', 'nb_programs', 'format_long_name',
-                    'start_time', 'duration', 'size', 'bit_rate', 'probe_score']}
-
-                all_format_tags = format_tags.copy()
-                for prop, value in format_properties.items():
-                    all_format_tags[prop] = value
-
-                metadata_info.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.Text(f"Arquivo: {os.path.basename(file_path)}", size=16, weight=ft.FontWeight.BOLD),
-                                *[ft.Text(f"{k.capitalize()}: {v}") for k, v in sorted(all_format_tags.items())]
-                            ], spacing=5),
-                            padding=10,
-                            border_radius=ft.border_radius.all(10),
-                            bgcolor=ft.colors.WHITE,
-                        ),
-                        elevation=2,
-                        margin=ft.margin.only(bottom=15)
-                    )
-                )
+            metadata_info = ft.ListView(spacing=15, on_scroll_interval=100, expand=True)
+            fill_paged(metadata_info, selected_files, build_metadata_card)
 
             metadata_dialog.content = ft.Container(
                 content=metadata_info,
@@ -298,17 +922,23 @@ def main(page: ft.Page):
 
     def camouflage_video_action(e):
         try:
-            if not selected_files:
-                output_message.value = "Nenhum arquivo selecionado para camuflar."
+            targets = without_running_jobs(checked_files(), "_camuflage")
+            if not targets:
+                output_message.value = "Nenhum arquivo selecionado para camuflar (ou já em processamento)."
                 page.update()
                 return
 
-            for file_path in selected_files:
-                base, ext = os.path.splitext(file_path)
-                output_path = f"{base}_camuflage{ext}"
+            for file_path in targets:
+                output_path = generate_output_path(file_path, "_camuflage")
 
-                result = camouflage_video(file_path, output_path)
-                output_message.value = f"{os.path.basename(file_path)}: {result}"
+                scheduler.submit(
+                    file_path,
+                    output_path,
+                    CAMOUFLAGE_METADATA,
+                    video_filters=CAMOUFLAGE_VIDEO_FILTERS,
+                    audio_filters=CAMOUFLAGE_AUDIO_FILTERS,
+                    watermark_path=selected_watermark()
+                )
 
             page.update()
         except Exception as err:
@@ -350,19 +980,69 @@ def main(page: ft.Page):
         on_click=camouflage_video_action,
         disabled=True
     )
+    cancel_button = ft.ElevatedButton(
+        "Cancelar",
+        icon=ft.icons.CANCEL,
+        on_click=lambda e: cancel_all(),
+        disabled=True
+    )
+    progress_bar = ft.ProgressBar(value=0, visible=False)
+
+    def cancel_all():
+        task.cancel()
+        scheduler.cancel_all()
+
+    def on_job_status(job):
+        if job.status == "done":
+            catalog.index_files([job.output_path])
+        state = file_states.get(job.file_path)
+        if state is not None:
+            label = STATUS_LABELS[job.status]
+            if job.status == "error":
+                label = f"{label}: {job.message}"
+            elif job.status == "running" and job.progress:
+                label = f"{label} {format_progress(job.progress)}"
+            state["status"] = label
+            state["status_color"] = ft.colors.RED if job.status == "error" else ft.colors.GREY_700
+            # Cards that were not scrolled into view yet pick the status up
+            # from the state when they are built.
+            if "status_control" in state:
+                state["status_control"].value = state["status"]
+                state["status_control"].color = state["status_color"]
+        pending = scheduler.pending()
+        finished = len(scheduler.jobs) - len(pending)
+        output_message.value = f"{finished}/{len(scheduler.jobs)} tarefa(s) concluída(s)."
+        if job.finished and job.message:
+            output_message.value += f"\n{os.path.basename(job.file_path)}: {job.message}"
+        cancel_button.disabled = not pending and not task.busy
+        progress_bar.visible = bool(pending) or task.busy
+        progress_bar.value = finished / len(scheduler.jobs) if scheduler.jobs else 0
+        throttle.request()
 
-    def update_buttons():
+    scheduler = VideoJobScheduler(on_status=on_job_status, cache=OutputCache())
+    # The pools' worker threads are joined at interpreter exit, so closing
+    # the window would otherwise wait for every queued encode to finish.
+    page.on_disconnect = lambda e: scheduler.shutdown(cancel=True)
+
+    def update_buttons(update=True):
         if selected_files:
             save_button.disabled = False
             show_metadata_button.disabled = False
             open_folder_button.disabled = False
             camouflage_button.disabled = False
+            bulk_switch.disabled = False
+            watermark_switch.disabled = False
         else:
             save_button.disabled = True
             show_metadata_button.disabled = True
             open_folder_button.disabled = True
             camouflage_button.disabled = True
-        page.update()
+            bulk_switch.disabled = True
+            bulk_switch.value = False
+            watermark_switch.disabled = True
+            bulk_panel.visible = False
+        if update:
+            page.update()
 
     metadata_dialog = ft.AlertDialog(
         title=ft.Text("Metadados dos Arquivos MP4"),
@@ -375,14 +1055,47 @@ def main(page: ft.Page):
     )
     page.overlay.append(metadata_dialog)
 
+    def toggle_bulk_mode(e):
+        bulk_panel.visible = bulk_switch.value
+        bulk_panel.update()
+
+    bulk_switch = ft.Switch(label="Edição em lote", value=False, on_change=toggle_bulk_mode, disabled=True)
+    watermark_switch = ft.Switch(label="Aplicar marca d'água (re-encodifica o vídeo)", value=False, disabled=True)
+    bulk_tags_field = ft.TextField(
+        label="Tags para os arquivos marcados",
+        hint_text="Uma por linha, ex.: artist=FlorianiStudio",
+        multiline=True,
+        min_lines=3,
+        width=600
+    )
+    bulk_panel = ft.Column(
+        [
+            bulk_tags_field,
+            ft.Row([
+                ft.ElevatedButton("Aplicar aos marcados", icon=ft.icons.DONE_ALL, on_click=apply_bulk_tags),
+                ft.TextButton("Marcar todos", on_click=lambda e: set_all_selected(True)),
+                ft.TextButton("Desmarcar todos", on_click=lambda e: set_all_selected(False)),
+            ], spacing=10)
+        ],
+        spacing=10,
+        visible=False
+    )
+
     page.add(
         ft.Row(
-            controls=[pick_button, save_button, show_metadata_button, open_folder_button, camouflage_button],
+            controls=[pick_button, save_button, show_metadata_button, open_folder_button, camouflage_button, cancel_button],
             spacing=10,
             alignment=ft.MainAxisAlignment.START
         ),
+        progress_bar,
+        ft.Row([bulk_switch, watermark_switch], spacing=20),
+        bulk_panel,
         metadata_display,
         output_card
     )
 
-ft.app(target=main)
+if __name__ == "__main__":
+    import flet as ft
+    from metrics import configure_from_env
+    configure_from_env()
+    ft.app(target=main)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".florianistudio", "outputs.sqlite3")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_fingerprint(file_path, content_hash=False):
+    if content_hash:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return f"sha256:{digest.hexdigest()}"
+    stat = os.stat(file_path)
+    return f"stat:{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    return repr(value)
+
+def params_hash(params):
+    encoded = json.dumps(params, sort_keys=True, default=_json_default)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class OutputCache:
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, content_hash=False):
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.content_hash = content_hash
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            "input_key TEXT NOT NULL, params_hash TEXT NOT NULL, output_path TEXT NOT NULL, "
+            "output_size INTEGER NOT NULL, output_mtime_ns INTEGER NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (input_key, params_hash))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS output_files ("
+            "input_key TEXT NOT NULL, params_hash TEXT NOT NULL, name TEXT NOT NULL, output_path TEXT NOT NULL, "
+            "output_size INTEGER NOT NULL, output_mtime_ns INTEGER NOT NULL, "
+            "PRIMARY KEY (input_key, params_hash, name))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _unchanged(output_path, output_size, output_mtime_ns):
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False
+        return stat.st_size == output_size and stat.st_mtime_ns == output_mtime_ns
+
+    def lookup(self, file_path, params):
+        hit = self.lookup_outputs(file_path, params)
+        return hit[0] if hit else None
+
+    def lookup_outputs(self, file_path, params):
+        # A hit needs the primary output and every recorded rendition to
+        # still exist unchanged; returns (output_path, {name: path}).
+        try:
+            input_key = file_fingerprint(file_path, self.content_hash)
+        except OSError:
+            return None
+        key = (input_key, params_hash(params))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_path, output_size, output_mtime_ns FROM outputs WHERE input_key = ? AND params_hash = ?", key
+            ).fetchone()
+            files = self._conn.execute(
+                "SELECT name, output_path, output_size, output_mtime_ns FROM output_files WHERE input_key = ? AND params_hash = ?", key
+            ).fetchall()
+        if row is None or not self._unchanged(*row):
+            return None
+        if not all(self._unchanged(*entry[1:]) for entry in files):
+            return None
+        return row[0], {name: output_path for name, output_path, _, _ in files}
+
+    def record(self, file_path, params, output_path, outputs=None):
+        input_key = file_fingerprint(file_path, self.content_hash)
+        key = (input_key, params_hash(params))
+        stat = os.stat(output_path)
+        files = []
+        for name, path in (outputs or {}).items():
+            file_stat = os.stat(path)
+            files.append((*key, name, path, file_stat.st_size, file_stat.st_mtime_ns))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, output_path, stat.st_size, stat.st_mtime_ns, time.time())
+            )
+            self._conn.execute("DELETE FROM output_files WHERE input_key = ? AND params_hash = ?", key)
+            self._conn.executemany("INSERT INTO output_files VALUES (?, ?, ?, ?, ?, ?)", files)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
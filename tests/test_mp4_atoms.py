@@ -0,0 +1,125 @@
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mp4_atoms import plan_mp4_metadata, read_moov, read_mp4_metadata, serialize_box, shift_chunk_offsets, write_mp4_metadata
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg não encontrado")
+
+def ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-v", "error", "-nostdin", "-y", *args], check=True)
+
+def ffmpeg_tags(path):
+    output = subprocess.run(["ffmpeg", "-v", "error", "-i", path, "-f", "ffmetadata", "-"], capture_output=True, text=True, check=True).stdout
+    return dict(line.split("=", 1) for line in output.splitlines() if "=" in line and not line.startswith(";"))
+
+@pytest.fixture(scope="module")
+def tagged_mp4(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("mp4") / "tagged.mp4")
+    ffmpeg(
+        "-f", "lavfi", "-i", "testsrc=duration=1:size=160x120:rate=10", "-c:v", "libx264",
+        "-metadata", "track=3/10", "-metadata", "disc=1/2", "-metadata", "keywords=foo",
+        "-metadata", "media_type=9", "-metadata", "location=+10.0000-020.0000/", path
+    )
+    return path
+
+def test_reads_integer_and_pair_items(tagged_mp4):
+    tags = read_mp4_metadata(tagged_mp4)["format"]["tags"]
+    assert tags["track"] == "3/10"
+    assert tags["disc"] == "1/2"
+    assert tags["keywords"] == "foo"
+    assert tags["media_type"] == "9"
+
+def test_writes_keys_ffmpeg_reads_back(tagged_mp4, tmp_path):
+    output = str(tmp_path / "out.mp4")
+    write_mp4_metadata(tagged_mp4, output, {"track": "5", "disc": "2/3", "keywords": "bar", "media_type": "10", "title": "T"})
+    tags = ffmpeg_tags(output)
+    assert (tags["track"], tags["disc"], tags["keywords"], tags["media_type"], tags["title"]) == ("5", "2/3", "bar", "10", "T")
+
+def test_unmapped_key_needs_remux(tagged_mp4, tmp_path):
+    with pytest.raises(ValueError):
+        write_mp4_metadata(tagged_mp4, str(tmp_path / "out.mp4"), {"location": "+1.0000+002.0000/"})
+    with pytest.raises(ValueError):
+        write_mp4_metadata(tagged_mp4, str(tmp_path / "out.mp4"), {"track": "not a number"})
+
+def packet_hashes(path):
+    # framemd5 of the stream-copied packets: any chunk offset that points at
+    # the wrong bytes changes a hash.
+    output = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-map", "0", "-c", "copy", "-f", "framemd5", "-"],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return [line for line in output.splitlines() if not line.startswith("#")]
+
+def to_co64(source, output):
+    # ffmpeg only writes co64 past 4 GiB, so the fixture rewrites stco as
+    # co64 and shifts the offsets by the moov growth.
+    moov, _, top_level, _ = read_moov(source)
+    _, moov_offset, moov_size, _ = next(entry for entry in top_level if entry[0] == b"moov")
+    for stco in list(moov.find_all(b"stco")):
+        count = struct.unpack_from(">I", stco.data, 4)[0]
+        stco.type = b"co64"
+        stco.data = stco.data[:8] + struct.pack(f">{count}Q", *struct.unpack_from(f">{count}I", stco.data, 8))
+    grown = len(serialize_box(moov)) - moov_size
+    shift_chunk_offsets(moov, moov_offset + moov_size, grown)
+    with open(source, "rb") as f:
+        data = f.read()
+    with open(output, "wb") as f:
+        f.write(data[:moov_offset] + serialize_box(moov) + data[moov_offset + moov_size:])
+
+@pytest.fixture(scope="module", params=["moov_last", "faststart", "faststart_co64"])
+def layout(request, tmp_path_factory):
+    folder = tmp_path_factory.mktemp(request.param)
+    moov_last = str(folder / "moov_last.mp4")
+    ffmpeg(
+        "-f", "lavfi", "-i", "testsrc=duration=1:size=160x120:rate=10",
+        "-f", "lavfi", "-i", "sine=duration=1", "-c:v", "libx264", "-c:a", "aac", moov_last
+    )
+    if request.param == "moov_last":
+        return request.param, moov_last
+    faststart = str(folder / "faststart.mp4")
+    ffmpeg("-i", moov_last, "-c", "copy", "-movflags", "+faststart", faststart)
+    if request.param == "faststart":
+        return request.param, faststart
+    co64 = str(folder / "co64.mp4")
+    to_co64(faststart, co64)
+    return request.param, co64
+
+def edit(source, output, tags, expected_mode):
+    assert plan_mp4_metadata(source, output, tags)["mode"] == expected_mode
+    write_mp4_metadata(source, output, tags, {"video": "Editado", "audio": "Editado"})
+    assert read_mp4_metadata(output)["format"]["tags"]["title"] == tags["title"]
+
+LONG_TITLE = "x" * 5000
+
+def test_packets_unchanged_in_every_mode(layout, tmp_path):
+    name, source = layout
+    expected = packet_hashes(source)
+    copied = str(tmp_path / "copied.mp4")
+    in_place = str(tmp_path / "in_place.mp4")
+    shutil.copy(source, in_place)
+    if name == "moov_last":
+        steps = [
+            (source, copied, LONG_TITLE, "copy"),
+            (in_place, in_place, LONG_TITLE, "extend"),
+            # extend leaves padding behind the moov, so a small edit fits.
+            (in_place, in_place, "curto", "overwrite"),
+        ]
+    else:
+        steps = [
+            (source, copied, LONG_TITLE, "shift"),
+            (in_place, in_place, LONG_TITLE, "append"),
+            (copied, str(tmp_path / "recopied.mp4"), "curto", "copy"),
+        ]
+    for step_source, step_output, title, mode in steps:
+        edit(step_source, step_output, {"title": title}, mode)
+        assert packet_hashes(step_output) == expected, mode
+    if name == "faststart_co64":
+        moov = read_moov(copied)[0]
+        assert list(moov.find_all(b"stco")) == [] and len(list(moov.find_all(b"co64"))) == 2
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output_cache import OutputCache
+
+PARAMS = {"op": "image", "options": {"renditions": {"full": None, "web": 200}}}
+
+def write(path, content=b"data"):
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+@pytest.fixture
+def recorded(tmp_path):
+    cache = OutputCache(str(tmp_path / "outputs.sqlite3"))
+    source = write(str(tmp_path / "a.jpg"), b"source")
+    outputs = {"full": write(str(tmp_path / "a_out.jpg")), "web": write(str(tmp_path / "a_out_web.jpg"))}
+    cache.record(source, PARAMS, outputs["full"], outputs)
+    yield cache, source, outputs
+    cache.close()
+
+def test_hit_returns_every_output(recorded):
+    cache, source, outputs = recorded
+    assert cache.lookup_outputs(source, PARAMS) == (outputs["full"], outputs)
+    assert cache.lookup(source, PARAMS) == outputs["full"]
+
+@pytest.mark.parametrize("name", ["full", "web"])
+def test_touched_output_is_a_miss(recorded, name):
+    cache, source, outputs = recorded
+    stat = os.stat(outputs[name])
+    os.utime(outputs[name], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.lookup_outputs(source, PARAMS) is None
+
+@pytest.mark.parametrize("name", ["full", "web"])
+def test_deleted_or_rewritten_output_is_a_miss(recorded, name):
+    cache, source, outputs = recorded
+    os.remove(outputs[name])
+    assert cache.lookup_outputs(source, PARAMS) is None
+    write(outputs[name], b"other size")
+    assert cache.lookup_outputs(source, PARAMS) is None
+
+def test_changed_input_or_params_is_a_miss(recorded):
+    cache, source, outputs = recorded
+    assert cache.lookup_outputs(source, {**PARAMS, "op": "other"}) is None
+    write(source, b"edited source")
+    assert cache.lookup_outputs(source, PARAMS) is None
+
+def test_rerecord_replaces_renditions(recorded):
+    cache, source, outputs = recorded
+    cache.record(source, PARAMS, outputs["full"], {"full": outputs["full"]})
+    os.remove(outputs["web"])
+    assert cache.lookup_outputs(source, PARAMS) == (outputs["full"], {"full": outputs["full"]})
+
+def test_run_batch_rebuilds_deleted_rendition(tmp_path):
+    from florianistudio import build_exif_dict, run_batch
+
+    logo = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logo render.png")
+    source = str(tmp_path / "a.jpg")
+    Image.effect_noise((320, 240), 40).convert("RGB").save(source, "jpeg")
+    cache = OutputCache(str(tmp_path / "outputs.sqlite3"))
+    options = {"renditions": {"full": None, "web": 120}}
+    first = next(run_batch([source], logo, build_exif_dict(), jobs=1, cache=cache, **options))
+    assert not first["cached"] and set(first["outputs"]) == {"full", "web"}
+    second = next(run_batch([source], logo, build_exif_dict(), jobs=1, cache=cache, **options))
+    assert second["cached"] and second["outputs"] == first["outputs"]
+    os.remove(first["outputs"]["web"])
+    third = next(run_batch([source], logo, build_exif_dict(), jobs=1, cache=cache, **options))
+    assert not third["cached"] and os.path.exists(first["outputs"]["web"])
+    cache.close()
@@ -0,0 +1,66 @@
+import os
+import struct
+import sys
+
+import piexif
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from florianistudio import splice_exif
+
+def jpeg_segments(data):
+    # (marker, payload) for every header segment, then the bytes from SOS on.
+    segments = []
+    offset = 2
+    while True:
+        code = data[offset + 1]
+        if code == 0xDA:
+            return segments, data[offset:]
+        (length,) = struct.unpack(">H", data[offset + 2:offset + 4])
+        segments.append((code, data[offset + 4:offset + 2 + length]))
+        offset += 2 + length
+
+def exif(artist):
+    return piexif.dump({"0th": {piexif.ImageIFD.Artist: artist.encode("ascii")}})
+
+def make_jpeg(path, **save_options):
+    img = Image.effect_noise((97, 61), 60).convert("RGB")
+    img.save(path, "jpeg", quality=90, **save_options)
+
+@pytest.mark.parametrize("save_options", [
+    {},
+    {"exif": exif("Antes")},
+    {"exif": exif("Antes"), "icc_profile": b"\x00" * 128, "comment": b"nota"},
+    {"progressive": True, "exif": exif("Antes")},
+])
+def test_splice_keeps_scan_bytes(tmp_path, save_options):
+    source = str(tmp_path / "in.jpg")
+    output = str(tmp_path / "out.jpg")
+    make_jpeg(source, **save_options)
+    new_exif = exif("Depois")
+    before = splice_exif(source, output, new_exif)
+
+    with open(source, "rb") as f:
+        source_segments, source_scan = jpeg_segments(f.read())
+    with open(output, "rb") as f:
+        output_segments, output_scan = jpeg_segments(f.read())
+    assert output_scan == source_scan
+
+    def is_exif(segment):
+        return segment[0] == 0xE1 and segment[1].startswith(b"Exif\x00\x00")
+
+    # Every other segment survives in order, with exactly one new Exif block.
+    assert [s for s in output_segments if not is_exif(s)] == [s for s in source_segments if not is_exif(s)]
+    assert [s[1] for s in output_segments if is_exif(s)] == [new_exif]
+    old = [s[1] for s in source_segments if is_exif(s)]
+    assert before == (old[0] if old else None)
+    with Image.open(output) as img:
+        assert piexif.load(img.info["exif"])["0th"][piexif.ImageIFD.Artist] == b"Depois"
+
+def test_splice_rejects_non_jpeg(tmp_path):
+    source = str(tmp_path / "in.png")
+    Image.new("RGB", (4, 4)).save(source, "png")
+    with pytest.raises(ValueError):
+        splice_exif(source, str(tmp_path / "out.jpg"), exif("x"))
@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video_jobs
+from mp4_metadata_editor import video_result
+from video_jobs import VideoJob, VideoJobScheduler
+
+def test_cancel_before_start_sets_terminal_status():
+    # The pool already picked the job up, so future.cancel() failed and
+    # _run is the one that sees the event.
+    scheduler = VideoJobScheduler()
+    job = VideoJob("a.mp4", "a_edited.mp4", {}, None, None)
+    scheduler.jobs.append(job)
+    job.cancel_event.set()
+    scheduler._run(job)
+    assert job.status == "cancelled"
+    assert scheduler.pending() == []
+    scheduler.shutdown()
+
+def test_cancel_queued_job(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def fake_update(file_path, *args, **kwargs):
+        started.set()
+        release.wait(5)
+        return video_result("done", "ok")
+
+    monkeypatch.setattr(video_jobs, "update_video_metadata", fake_update)
+    scheduler = VideoJobScheduler(copy_slots=1)
+    first = scheduler.submit("a.mp4", "a_edited.mp4", {"title": "a"})
+    assert started.wait(5)
+    second = scheduler.submit("b.mp4", "b_edited.mp4", {"title": "b"})
+    scheduler.cancel(second)
+    release.set()
+    scheduler.shutdown()
+    assert first.status == "done"
+    assert second.status == "cancelled"
+    assert scheduler.pending() == []
+
+def test_status_follows_result_not_message(monkeypatch):
+    results = {
+        "a.mp4": video_result("error", "Falhou", "boom"),
+        "b.mp4": video_result("done", "Erro nenhum"),
+    }
+    monkeypatch.setattr(video_jobs, "update_video_metadata", lambda file_path, *args, **kwargs: results[file_path])
+    scheduler = VideoJobScheduler()
+    failed = scheduler.submit("a.mp4", "a_edited.mp4", {"title": "a"})
+    done = scheduler.submit("b.mp4", "b_edited.mp4", {"title": "b"})
+    scheduler.shutdown()
+    assert (failed.status, failed.message) == ("error", "Falhou")
+    assert done.status == "done"
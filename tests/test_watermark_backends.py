@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import florianistudio
+from florianistudio import watermark_image
+
+LOGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logo render.png")
+SIZES = [(601, 1203), (50, 40), (1024, 768)]
+
+def random_rgb(size, seed):
+    rng = random.Random(seed)
+    return Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+
+@pytest.mark.parametrize("size", SIZES)
+def test_numpy_matches_pillow(size):
+    if florianistudio.np is None:
+        pytest.skip("numpy não instalado")
+    img = random_rgb(size, seed=size[0] * size[1])
+    expected = watermark_image(img, LOGO, backend="pillow")
+    actual = watermark_image(img, LOGO, backend="numpy")
+    assert actual.mode == expected.mode == "RGB"
+    assert actual.tobytes() == expected.tobytes()
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("in_place", [False, True])
+def test_strips_match_pillow(size, in_place):
+    img = random_rgb(size, seed=size[0] + size[1])
+    expected = watermark_image(img, LOGO, backend="pillow")
+    actual = watermark_image(img.copy(), LOGO, backend="strips", in_place=in_place)
+    assert actual.mode == expected.mode == "RGB"
+    assert actual.tobytes() == expected.tobytes()
+
+def test_strips_band_boundaries(monkeypatch):
+    # Tiles straddling several band edges must still be pasted in order.
+    monkeypatch.setattr(florianistudio, "WATERMARK_STRIP_HEIGHT", 7)
+    img = random_rgb((301, 257), seed=7)
+    expected = watermark_image(img, LOGO, backend="pillow")
+    assert watermark_image(img, LOGO, backend="strips").tobytes() == expected.tobytes()
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+UI_FPS = 15
+
+class UpdateThrottle:
+    # Coalesces page.update() requests from worker threads into at most
+    # UI_FPS updates per second; the last request is never dropped.
+    def __init__(self, page, fps=UI_FPS):
+        self.page = page
+        self.interval = 1.0 / fps
+        self._lock = threading.Lock()
+        self._timer = None
+        self._last_update = 0.0
+
+    def request(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            delay = max(0.0, self._last_update + self.interval - time.monotonic())
+            self._timer = threading.Timer(delay, self._update)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._update()
+
+    def _update(self):
+        with self._lock:
+            self._timer = None
+            self._last_update = time.monotonic()
+        try:
+            self.page.update()
+        except Exception as e:
+            metrics.log(f"Falha ao atualizar a interface: {str(e)}", level="warning")
+
+class BackgroundTask:
+    # Runs one job at a time off the Flet event handlers. start() returns
+    # False while a previous run is still going, which guards against double
+    # clicks starting overlapping batches.
+    def __init__(self, page, on_state=None):
+        self.page = page
+        self.on_state = on_state
+        self.cancel_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-task")
+        self._lock = threading.Lock()
+        self._busy = False
+
+    @property
+    def busy(self):
+        return self._busy
+
+    def start(self, func, *args):
+        with self._lock:
+            if self._busy:
+                return False
+            self._busy = True
+            self.cancel_event = threading.Event()
+        self._notify(True)
+        run_task = getattr(self.page, "run_task", None)
+        if run_task is not None:
+            run_task(self._run_async, func, args)
+        else:
+            self._executor.submit(self._run, func, args)
+        return True
+
+    async def _run_async(self, func, args):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._run, func, args)
+
+    def _run(self, func, args):
+        try:
+            func(self.cancel_event, *args)
+        except Exception as e:
+            metrics.error("ui_task", str(e))
+        finally:
+            with self._lock:
+                self._busy = False
+            self._notify(False)
+
+    def _notify(self, busy):
+        if self.on_state:
+            self.on_state(busy)
+
+    def cancel(self):
+        self.cancel_event.set()
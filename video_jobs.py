@@ -0,0 +1,139 @@
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from mp4_metadata_editor import update_video_metadata, video_operation_params, video_result
+
+COPY_LANE = "copy"
+ENCODE_LANE = "encode"
+STATUS_LABELS = {
+    "queued": "Na fila",
+    "running": "Processando",
+    "done": "Concluído",
+    "error": "Erro",
+    "cancelled": "Cancelado",
+}
+
+class VideoJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, file_path, output_path, new_metadata, video_filters, audio_filters, watermark_path=None):
+        self.id = next(self._ids)
+        self.file_path = file_path
+        self.output_path = output_path
+        self.new_metadata = new_metadata
+        self.video_filters = video_filters
+        self.audio_filters = audio_filters
+        self.watermark_path = watermark_path
+        self.lane = ENCODE_LANE if video_filters or audio_filters or watermark_path else COPY_LANE
+        self.status = "queued"
+        self.message = ""
+        self.threads = None
+        self.progress = None
+        self.params = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error", "cancelled")
+
+class VideoJobScheduler:
+    def __init__(self, cpu_budget=None, encode_slots=None, copy_slots=4, on_status=None, cache=None):
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.encode_slots = encode_slots or max(1, self.cpu_budget // 4)
+        self.threads_per_encode = max(1, self.cpu_budget // self.encode_slots)
+        self.on_status = on_status
+        self.cache = cache
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._pools = {
+            COPY_LANE: ThreadPoolExecutor(max_workers=copy_slots, thread_name_prefix="video-copy"),
+            ENCODE_LANE: ThreadPoolExecutor(max_workers=self.encode_slots, thread_name_prefix="video-encode"),
+        }
+
+    def submit(self, file_path, output_path, new_metadata=None, video_filters=None, audio_filters=None, watermark_path=None):
+        job = VideoJob(file_path, output_path, new_metadata or {}, video_filters, audio_filters, watermark_path)
+        if job.lane == ENCODE_LANE:
+            job.threads = self.threads_per_encode
+        with self._lock:
+            self.jobs.append(job)
+        if self.cache is not None:
+            job.params = video_operation_params(job.new_metadata, output_path, video_filters, audio_filters, watermark_path=watermark_path)
+            if self.cache.lookup(file_path, job.params) == output_path:
+                self._set_status(job, "done", "Já processado anteriormente, nada a fazer.")
+                return job
+        self._notify(job)
+        job.future = self._pools[job.lane].submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        # cancel() can lose the race with the pool picking the job up, so a
+        # job cancelled before it started still needs its terminal status.
+        if job.cancel_event.is_set():
+            self._set_status(job, "cancelled")
+            return
+        self._set_status(job, "running")
+        try:
+            result = update_video_metadata(
+                job.file_path,
+                job.new_metadata,
+                job.output_path,
+                video_filters=job.video_filters,
+                audio_filters=job.audio_filters,
+                watermark_path=job.watermark_path,
+                threads=job.threads,
+                cancel_event=job.cancel_event,
+                on_progress=lambda progress: self._set_progress(job, progress)
+            )
+        except Exception as e:
+            result = video_result("error", f"Erro: {str(e)}", str(e))
+        if job.cancel_event.is_set() or result["status"] == "cancelled":
+            self._set_status(job, "cancelled", result["message"])
+        elif result["status"] == "error":
+            self._set_status(job, "error", result["message"])
+        else:
+            if self.cache is not None:
+                self.cache.record(job.file_path, job.params, job.output_path)
+            self._set_status(job, "done", result["message"])
+
+    def _set_status(self, job, status, message=""):
+        job.status = status
+        job.message = message
+        if job.finished:
+            metrics.count("videos_processed", status=status, lane=job.lane)
+        with self._lock:
+            depth = sum(1 for other in self.jobs if other.lane == job.lane and not other.finished)
+        metrics.gauge("video_queue_depth", depth, lane=job.lane)
+        self._notify(job)
+
+    def _set_progress(self, job, progress):
+        job.progress = progress
+        self._notify(job)
+
+    def _notify(self, job):
+        if self.on_status:
+            self.on_status(job)
+
+    def cancel(self, job):
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._set_status(job, "cancelled")
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = [job for job in self.jobs if not job.finished]
+        for job in jobs:
+            self.cancel(job)
+
+    def pending(self):
+        with self._lock:
+            return [job for job in self.jobs if not job.finished]
+
+    def shutdown(self, cancel=False):
+        if cancel:
+            self.cancel_all()
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
@@ -0,0 +1,177 @@
+import fnmatch
+import os
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+STABLE_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+QUEUE_SIZE = 32
+
+class StabilityTracker:
+    # A file is handed over once its size and mtime stayed the same for
+    # stable_seconds, i.e. the copy/export that is writing it has finished.
+    def __init__(self, stable_seconds=STABLE_SECONDS):
+        self.stable_seconds = stable_seconds
+        self._lock = threading.Lock()
+        self._candidates = {}
+        self._handed_over = {}
+
+    def touch(self, path):
+        with self._lock:
+            self._candidates.setdefault(path, None)
+
+    def ready(self):
+        now = time.monotonic()
+        with self._lock:
+            candidates = dict(self._candidates)
+        ready = []
+        for path, previous in candidates.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._discard(path)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._handed_over.get(path) == signature:
+                self._discard(path)
+            elif previous is None or previous[0] != signature:
+                with self._lock:
+                    self._candidates[path] = (signature, now)
+            elif stat.st_size > 0 and now - previous[1] >= self.stable_seconds:
+                ready.append((path, signature))
+        return ready
+
+    def hand_over(self, path, signature):
+        with self._lock:
+            self._handed_over[path] = signature
+            self._candidates.pop(path, None)
+
+    def _discard(self, path):
+        with self._lock:
+            self._candidates.pop(path, None)
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        path = getattr(event, "dest_path", None) or event.src_path
+        if self.watcher.accepts(path):
+            self.watcher.tracker.touch(path)
+
+class FolderWatcher:
+    def __init__(self, folder, patterns, exclude=None, recursive=False, stable_seconds=STABLE_SECONDS, poll_interval=POLL_INTERVAL, queue_size=QUEUE_SIZE, use_events=True):
+        self.folder = os.path.abspath(folder)
+        self.patterns = [pattern.lower() for pattern in patterns]
+        self.exclude = exclude
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.tracker = StabilityTracker(stable_seconds)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.mode = "events" if use_events and Observer is not None else "polling"
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def accepts(self, path):
+        name = os.path.basename(path).lower()
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+            return False
+        return not (self.exclude and self.exclude(path))
+
+    def scan(self):
+        if self.recursive:
+            walker = os.walk(self.folder)
+        else:
+            walker = [(self.folder, [], [entry.name for entry in os.scandir(self.folder) if entry.is_file()])]
+        for root, _, names in walker:
+            for name in names:
+                path = os.path.join(root, name)
+                if self.accepts(path):
+                    self.tracker.touch(path)
+
+    def start(self):
+        self.scan()
+        if self.mode == "events":
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.folder, recursive=self.recursive)
+            self._observer.start()
+        self._thread = threading.Thread(target=self._loop, name="watch-folder", daemon=True)
+        self._thread.start()
+        metrics.log(f"Observando {self.folder} ({self.mode}).")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.mode == "polling":
+                try:
+                    self.scan()
+                except OSError as e:
+                    metrics.error("watch", str(e), self.folder)
+            for path, signature in self.tracker.ready():
+                if not self._enqueue(path):
+                    return
+                self.tracker.hand_over(path, signature)
+            self._stop.wait(self.poll_interval)
+
+    def _enqueue(self, path):
+        # Blocks while the queue is full so a burst of files waits on disk
+        # instead of piling up in memory.
+        while not self._stop.is_set():
+            try:
+                self.queue.put(path, timeout=self.poll_interval)
+            except queue.Full:
+                continue
+            metrics.gauge("watch_queue_depth", self.queue.qsize())
+            return True
+        return False
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()
+
+def run_watch(watcher, handler, workers=1, stop_event=None):
+    stop_event = stop_event or threading.Event()
+
+    def work():
+        while not stop_event.is_set():
+            try:
+                path = watcher.queue.get(timeout=watcher.poll_interval)
+            except queue.Empty:
+                continue
+            try:
+                handler(path)
+            except Exception as e:
+                metrics.error("watch", str(e), path)
+            finally:
+                watcher.queue.task_done()
+                metrics.gauge("watch_queue_depth", watcher.queue.qsize())
+
+    watcher.start()
+    threads = [threading.Thread(target=work, name=f"watch-worker-{index}", daemon=True) for index in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    try:
+        while not stop_event.wait(watcher.poll_interval):
+            pass
+    finally:
+        stop_event.set()
+        watcher.stop()
+        for thread in threads:
+            thread.join()